@@ -1,11 +1,27 @@
 from flask import (
     Flask, render_template, request, redirect,
-    send_from_directory, url_for
+    url_for, jsonify
 )
 import os, re, sqlite3
+import db
 from datetime import datetime
-from pdf2image import convert_from_path
-import pytesseract
+from ocr_store import init_ocr_store, file_sha256
+import ocr_service
+from ingest_jobs import init_ingest_jobs, start_worker, jobs_bp
+import search_index
+import pagination
+import document_store
+import db_indexes
+import facets
+import data_version
+import ocr_failures
+import upload_store
+import blob_store
+import file_serving
+from chunked_upload import chunked_upload_bp, init_upload_sessions
+from previews import previews_bp, image_path
+from thumb_cache import thumb_bp
+from page_ocr import page_ocr_bp, init_page_store
 
 # === INIT ===
 app = Flask(__name__)
@@ -13,12 +29,22 @@ app.secret_key = os.environ.get("FLASK_SECRET_KEY", os.urandom(24).hex())
 
 # --- Paths & constants ---
 UPLOAD_FOLDER  = 'uploads'
-DB_FILE        = 'database.db'
 COMPANY_TYPES  = ['PT', 'CV', 'UD', 'Koperasi', 'Yayasan']
 ALLOWED_EXT    = {'.pdf'}
+SORTABLE_TEXT_COLUMNS = ['filename', 'category', 'company_type', 'company_name', 'issued_date']
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = upload_store.MAX_REQUEST_BYTES
+
+# Optional X-Sendfile offload for /uploads (FILE_OFFLOAD)
+file_serving.configure(app)
+
+# Multipart file parts stream to disk (hashed) instead of into memory
+app.request_class = upload_store.StreamingRequest
+
+# Per-thread connection survives the request; never leak an open transaction
+app.teardown_appcontext(lambda exc: db.release())
 
 # === Filters ===
 @app.template_filter('datetimeformat')
@@ -28,9 +54,12 @@ def datetimeformat(value, fmt='%d/%b/%Y'):
     except Exception:
         return value
 
+app.add_template_filter(search_index.highlight, 'highlight')
+app.add_template_test(document_store.is_truncated, 'truncated')
+
 # === Helpers ===
 def init_db():
-    with sqlite3.connect(DB_FILE) as conn:
+    with db.get_connection() as conn:
         conn.execute('''
             CREATE TABLE IF NOT EXISTS documents (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -43,6 +72,22 @@ def init_db():
                 notes TEXT
             )
         ''')
+        init_ocr_store(conn)
+        blob_store.init_blob_store(conn)
+        document_store.init_document_store(conn)
+        init_ingest_jobs(conn)
+        init_upload_sessions(conn)
+        init_page_store(conn)
+        ocr_failures.init_ocr_failures(conn)
+        search_index.init_search_index(conn)
+        facets.init_facets(conn)
+        data_version.init_data_version(conn)
+
+        # Keyset pagination compares row values, which NULLs would break
+        for col in SORTABLE_TEXT_COLUMNS:
+            conn.execute(f"UPDATE documents SET {col} = '' WHERE {col} IS NULL")
+
+        db_indexes.ensure_indexes(conn)
 
 def allowed_file(filename):
     return os.path.splitext(filename)[1].lower() in ALLOWED_EXT
@@ -51,20 +96,22 @@ def company_name_valid(name: str) -> bool:
     pattern = r'^(?:' + '|'.join(re.escape(t) + r'\.?' for t in COMPANY_TYPES) + r')\s'
     return not re.match(pattern, name.strip(), re.IGNORECASE)
 
-def extract_text_from_pdf(path):
-    try:
-        img = convert_from_path(path, first_page=1, last_page=1)[0]
-        return pytesseract.image_to_string(img)
-    except Exception as e:
-        return f"[Gagal ekstraksi: {e}]"
-
 def insert_document_db(meta):
-    with sqlite3.connect(DB_FILE) as conn:
+    """Insert the confirmed upload; ``False`` when its file is no longer stored."""
+    with db.get_connection() as conn:
+        content_hash = blob_store.hash_for(conn, meta['filename'])
+        if content_hash is None:
+            # legacy upload stored flat in uploads/
+            pdf_path = os.path.join(UPLOAD_FOLDER, meta['filename'])
+            if not os.path.exists(pdf_path):
+                return False
+            content_hash = file_sha256(pdf_path)
+
         conn.execute('''
             INSERT INTO documents
             (filename, category, doc_type, company_type,
-             company_name, issued_date, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+             company_name, issued_date, notes, notes_preview, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             meta['filename'],
             meta.get('category') or meta.get('custom_category'),
@@ -72,8 +119,11 @@ def insert_document_db(meta):
             meta['company_type'],
             meta['company_name'],
             meta['issued_date'],
-            meta['notes']
+            meta['notes'],
+            document_store.notes_preview(meta['notes']),
+            content_hash
         ))
+    return True
 
 # === Routes ===
 @app.route('/')
@@ -90,15 +140,37 @@ def upload_file():
     if not file.filename.lower().endswith('.pdf'):
         return "Only PDF files are supported.", 400
 
-    path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(path)
-
-    extracted_text = extract_text_from_pdf(path)
-
+    # Identical content is stored once; a clashing name gets a free variant
+    filename, content_hash, _ = upload_store.save_upload(file, file.filename)
+    path = blob_store.blob_path(UPLOAD_FOLDER, content_hash)
+
+    _, extracted_text = ocr_service.ocr_upload(path, content_hash)
+    return render_confirm(filename, extracted_text)
+
+@app.route('/upload/confirm/<path:filename>')
+def confirm_upload(filename):
+    """Confirmation page for a file stored by a chunked upload session."""
+    with db.get_connection() as conn:
+        content_hash = blob_store.hash_for(conn, filename)
+    if content_hash is None:
+        return "File tidak ditemukan.", 404
+
+    # finalize already ran OCR; a failure shows from ocr_failures
+    return render_confirm(filename, ocr_service.stored_text(content_hash))
+
+def render_confirm(filename, extracted_text):
+    with db.get_connection() as conn:
+        content_hash = blob_store.hash_for(conn, filename)
+        ocr_failure = ocr_failures.failure_for(conn, content_hash)
+    preview_url = None
+    if content_hash and image_path('preview', content_hash).exists():
+        preview_url = url_for('previews_bp.image', key=content_hash, kind='preview')
     return render_template(
         'confirm.html',
-        filename=file.filename,
+        filename=filename,
         extracted_text=extracted_text,
+        ocr_failure=ocr_failure,
+        preview_url=preview_url,
         company_types=COMPANY_TYPES
     )
 
@@ -109,7 +181,8 @@ def save_metadata():
     if not company_name_valid(f.get('company_name', '')):
         return "Nama perusahaan tidak boleh diawali dengan jenis perusahaan.", 400
 
-    insert_document_db(f)
+    if not insert_document_db(f):
+        return "File unggahan tidak ditemukan lagi; silakan unggah ulang.", 409
     return redirect('/documents')
 
 @app.route('/documents')
@@ -119,49 +192,81 @@ def list_documents():
     company_name  = request.args.get('company_name', '')
     date_from     = request.args.get('date_from', '')
     date_to       = request.args.get('date_to', '')
-    sort_by       = request.args.get('sort_by', 'id')
+    q             = request.args.get('q', '').strip()
+    match         = search_index.fts_query(q)
+    sort_by       = request.args.get('sort_by', 'rank' if match else 'id')
     sort_dir      = request.args.get('sort_dir', 'asc').lower()
 
     valid_sort = {'id','filename','category','company_type','company_name','issued_date'}
+    if match: valid_sort.add('rank')
     if sort_by not in valid_sort: sort_by = 'id'
     if sort_dir not in {'asc','desc'}: sort_dir = 'asc'
 
-    where, params = [], []
-    if category:      where.append("category = ?");      params.append(category)
-    if company_type:  where.append("company_type = ?");  params.append(company_type)
-    if company_name:  where.append("company_name = ?");  params.append(company_name)
-    if date_from:     where.append("issued_date >= ?");  params.append(date_from)
-    if date_to:       where.append("issued_date <= ?");  params.append(date_to)
+    per_page = pagination.clamp_per_page(request.args.get('per_page'))
+    after    = pagination.decode_cursor(request.args.get('after', ''))
+    before   = pagination.decode_cursor(request.args.get('before', ''))
 
-    sql = "SELECT * FROM documents"
-    if where: sql += " WHERE " + " AND ".join(where)
-    sql += f" ORDER BY {sort_by} {sort_dir.upper()}"
+    filters = {
+        'category': category, 'company_type': company_type,
+        'company_name': company_name, 'date_from': date_from, 'date_to': date_to,
+    }
+    sql, params, page_seek = document_store.build_list_query(
+        filters, match, sort_by, sort_dir, per_page, after, before
+    )
 
-    with sqlite3.connect(DB_FILE) as conn:
-        cur = conn.cursor()
-        docs = cur.execute(sql, params).fetchall()
-        categories = [r[0] for r in cur.execute("SELECT DISTINCT category FROM documents WHERE category IS NOT NULL AND category != ''")]
-        company_types = [r[0] for r in cur.execute("SELECT DISTINCT company_type FROM documents WHERE company_type IS NOT NULL AND company_type != ''")]
-        companies = [r[0] for r in cur.execute("SELECT DISTINCT company_name FROM documents WHERE company_name IS NOT NULL AND company_name != ''")]
+    with db.get_connection() as conn:
+        version, last_modified = data_version.current(conn)
+        etag = data_version.list_etag(version)
+        unchanged = data_version.not_modified(etag, last_modified)
+        if unchanged:
+            return unchanged
 
-    return render_template(
+        cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
+        page = pagination.paginate(
+            cur.execute(sql, params).fetchall(), per_page,
+            page_seek.backwards, had_cursor=bool(after or before),
+            key_index='sort_key', id_index='id'
+        )
+        facet_values = facets.load_facets(conn)
+
+    # Prev/next keep every filter and sort setting, only the cursor changes
+    page_args = {k: v for k, v in request.args.items() if k not in ('after', 'before')}
+    next_url = url_for('list_documents', **page_args, after=page.next_cursor) if page.next_cursor else None
+    prev_url = url_for('list_documents', **page_args, before=page.prev_cursor) if page.prev_cursor else None
+
+    html = render_template(
         'list_documents.html',
-        documents=docs,
-        categories=categories,
-        company_types=company_types,
-        companies=companies,
+        documents=page.rows,
+        next_url=next_url,
+        prev_url=prev_url,
+        per_page=per_page,
+        categories=facet_values['category'],
+        company_types=facet_values['company_type'],
+        companies=facet_values['company_name'],
         selected_category=category,
         selected_company_type=company_type,
         selected_company=company_name,
         date_from=date_from,
         date_to=date_to,
+        q=q,
         sort_by=sort_by,
         sort_dir=sort_dir
     )
+    return data_version.with_validators(html, etag, last_modified)
+
+@app.route('/documents/<int:doc_id>/notes')
+def document_notes(doc_id):
+    """Full notes for one row of the list page, loaded on demand."""
+    with db.get_connection() as conn:
+        notes = document_store.get_notes(conn, doc_id)
+    if notes is None:
+        return jsonify(error="not found"), 404
+    return jsonify(id=doc_id, notes=notes)
 
 @app.route('/edit/<int:doc_id>', methods=['GET', 'POST'])
 def edit_metadata(doc_id):
-    with sqlite3.connect(DB_FILE) as conn:
+    with db.get_connection() as conn:
         cur = conn.cursor()
 
         if request.method == 'POST':
@@ -172,7 +277,7 @@ def edit_metadata(doc_id):
             cur.execute('''
                 UPDATE documents
                 SET category=?, doc_type=?, company_type=?, company_name=?,
-                    issued_date=?, notes=?
+                    issued_date=?, notes=?, notes_preview=?
                 WHERE id=?
             ''', (
                 f.get('category') or f.get('custom_category'),
@@ -181,6 +286,7 @@ def edit_metadata(doc_id):
                 f.get('company_name'),
                 f.get('issued_date'),
                 f.get('notes'),
+                document_store.notes_preview(f.get('notes')),
                 doc_id
             ))
             conn.commit()
@@ -188,46 +294,87 @@ def edit_metadata(doc_id):
 
         cur.execute("SELECT * FROM documents WHERE id=?", (doc_id,))
         doc = cur.fetchone()
-
-    pdf_path = os.path.join(UPLOAD_FOLDER, doc[1])
-    extracted_text = extract_text_from_pdf(pdf_path)
+        pdf_path = blob_store.local_path(conn, UPLOAD_FOLDER, doc[1])
+        extracted_text = ocr_service.document_text(conn, doc_id, pdf_path)
+        content_hash = cur.execute(
+            "SELECT content_hash FROM documents WHERE id=?", (doc_id,)
+        ).fetchone()[0]     # set by document_text for documents that predate it
+        ocr_failure = ocr_failures.failure_for(conn, content_hash)
+        conn.commit()
 
     return render_template(
         'edit.html',
         doc=doc,
         filename=doc[1],
         extracted_text=extracted_text,
+        ocr_failure=ocr_failure,
         company_types=COMPANY_TYPES
     )
 
+@app.route('/edit/<int:doc_id>/ocr', methods=['POST'])
+def retry_ocr(doc_id):
+    with db.get_connection() as conn:
+        r = conn.execute(
+            "SELECT filename, content_hash FROM documents WHERE id=?", (doc_id,)
+        ).fetchone()
+        if r is None:
+            return "Dokumen tidak ditemukan.", 404
+        pdf_path = blob_store.local_path(conn, UPLOAD_FOLDER, r[0])
+    if r[1] and pdf_path.exists():
+        ocr_service.retry_document(r[1], pdf_path)
+    return redirect(f'/edit/{doc_id}')
+
 @app.route('/delete/<int:doc_id>')
 def delete_document(doc_id):
-    with sqlite3.connect(DB_FILE) as conn:
+    with db.get_connection() as conn:
         cur = conn.cursor()
-        cur.execute("SELECT filename FROM documents WHERE id=?", (doc_id,))
+        cur.execute("SELECT filename, content_hash FROM documents WHERE id=?", (doc_id,))
         r = cur.fetchone()
-        if r:
+        cur.execute("DELETE FROM documents WHERE id=?", (doc_id,))
+        if r and blob_store.hash_for(conn, r[0]):
+            # the blob goes once no other document references it
+            blob_store.release_unused(conn, UPLOAD_FOLDER, r[1])
+        elif r:
             file_path = os.path.join(UPLOAD_FOLDER, r[0])
             if os.path.exists(file_path):
                 os.remove(file_path)
-        cur.execute("DELETE FROM documents WHERE id=?", (doc_id,))
         conn.commit()
     return redirect('/documents')
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    with db.get_connection() as conn:
+        content_hash = blob_store.hash_for(conn, filename)
+    if content_hash is None:
+        return file_serving.serve_legacy(UPLOAD_FOLDER, filename)
+    return file_serving.serve_blob(
+        blob_store.blob_path(UPLOAD_FOLDER, content_hash), UPLOAD_FOLDER,
+        content_hash, os.path.basename(filename)
+    )
 
 @app.route('/healthz')
 def health_check():
     return "OK", 200
 
+@app.route('/ocr-cache/stats')
+def ocr_cache_stats():
+    return jsonify(ocr_service.stats())
+
 # === Register batch upload blueprint ===
 from batch_upload import batch_upload_bp
 app.register_blueprint(batch_upload_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(chunked_upload_bp)
+app.register_blueprint(previews_bp)
+app.register_blueprint(thumb_bp)
+app.register_blueprint(page_ocr_bp)
 
 # === Always initialize DB on app start ===
 init_db()
+upload_store.sweep_incoming(UPLOAD_FOLDER)
+
+# === Resume queued batch ingestion in this worker ===
+start_worker()
 
 # === Only run Flask dev server in local ===
 if __name__ == '__main__':
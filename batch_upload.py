@@ -4,12 +4,13 @@ from flask import (
 )
 from werkzeug.utils import secure_filename
 from pathlib import Path
-from pdf2image import convert_from_path
-import pytesseract
-import sqlite3, os
+import os
+
+from blob_store import blob_path
+from ingest_jobs import enqueue_files
+from upload_store import save_upload
 
 # ───────────────────────── CONSTANTS ─────────────────────────
-DB_FILE      = "database.db"
 ALLOWED_EXT  = {".pdf"}
 
 # ──────────────────────── BLUEPRINT SETUP ─────────────────────
@@ -21,33 +22,6 @@ batch_upload_bp = Blueprint(
 def allowed_file(filename: str) -> bool:
     return os.path.splitext(filename)[1].lower() in ALLOWED_EXT
 
-def extract_text_from_pdf(path: Path) -> str:
-    """
-    Returns OCR text from the first page of a PDF.
-    Falls back to an error string if something goes wrong.
-    """
-    try:
-        img = convert_from_path(path, first_page=1, last_page=1)[0]
-        return pytesseract.image_to_string(img)
-    except Exception as e:
-        return f"[Gagal ekstraksi: {e}]"
-
-def insert_document(filename: str, notes: str) -> None:
-    """
-    Inserts a *minimal* record into the 'documents' table.
-    Blank strings are stored for category, company, etc.
-    """
-    with sqlite3.connect(DB_FILE) as conn:
-        conn.execute(
-            """
-            INSERT INTO documents
-            (filename, category, doc_type, company_type,
-             company_name, issued_date, notes)
-            VALUES (?, '', '', '', '', '', ?)
-            """,
-            (filename, notes)
-        )
-
 # ─────────────────────────── ROUTES ──────────────────────────
 @batch_upload_bp.route("/batch-upload", methods=["GET"])
 def show():
@@ -56,14 +30,19 @@ def show():
 
 @batch_upload_bp.route("/batch-upload", methods=["POST"])
 def upload():
-    """Handle multi‑file or folder upload of PDFs."""
+    """
+    Handle multi‑file or folder upload of PDFs.
+    Files are only saved here; OCR and the DB inserts run in the
+    background ingest worker, so the request returns immediately.
+    """
     files = request.files.getlist("documents")
     if not files:
         flash("⚠️ Tidak ada file yang dipilih.", "warning")
         return redirect(url_for("batch_upload_bp.show"))
 
     upload_dir = Path(current_app.config["UPLOAD_FOLDER"])
-    success, failed = 0, 0
+    failed = 0
+    saved, hashes, names = [], [], []
 
     for file in files:
         if not file or file.filename == "":
@@ -72,17 +51,15 @@ def upload():
             failed += 1
             continue
 
-        filename  = secure_filename(file.filename)
-        save_path = upload_dir / filename
-        file.save(save_path)
+        filename, content_hash, _ = save_upload(file, secure_filename(file.filename))
+        saved.append(blob_path(upload_dir, content_hash))
+        hashes.append(content_hash)
+        names.append(filename)
 
-        try:
-            notes = extract_text_from_pdf(save_path).strip()
-            insert_document(filename, notes)
-            success += 1
-        except Exception as e:
-            print("❌ Batch error:", filename, "→", e)
-            failed += 1
+    if not saved:
+        flash(f"❌ {failed} file gagal: hanya PDF yang didukung.", "warning")
+        return redirect(url_for("batch_upload_bp.show"))
 
-    flash(f"✅ {success} dokumen berhasil diunggah. ❌ {failed} gagal.", "info")
-    return redirect(url_for("list_documents"))
+    job_id = enqueue_files(saved, hashes, names)
+    flash(f"⏳ {len(saved)} dokumen masuk antrean. ❌ {failed} gagal.", "info")
+    return redirect(url_for("jobs_bp.show", job_id=job_id))
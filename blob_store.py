@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+blob_store.py
+-------------------------------------------------
+Content-addressed storage for uploaded PDFs.
+
+Each distinct file content is stored once, as
+``uploads/ab/cd/<sha256>.pdf`` (sharded on the first two bytes of the
+hash), and recorded in ``blobs``. The name a user uploaded it under is
+only a key in ``file_blobs`` (filename → blob): uploading the same PDF
+again, under any name, stores nothing new, and because
+``documents.content_hash`` already has cached OCR text for it, it is
+not OCR'd either.
+
+A name, once mapped, never changes content: a different PDF uploaded
+under a taken name gets a free variant (``name_1.pdf``) instead of
+overwriting the file another document points at.
+
+``blobs.refcount`` counts the documents using a blob and is kept by
+triggers on ``documents``; deleting the last one removes the file,
+unless an upload of the same content is still pending (mapped less than
+``PENDING_HOURS`` ago and not saved as a document yet, or queued for
+batch ingest).
+
+Files saved before this module existed live flat in ``uploads/`` and
+are still served from there. To move them into the store:
+
+Run: python blob_store.py migrate [path/to/uploads]
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+import os
+import sqlite3
+import sys
+
+from db import get_connection
+from ocr_store import column_exists, file_sha256
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+UPLOAD_FOLDER = "uploads"
+BLOB_SUFFIX   = ".pdf"
+PENDING_HOURS = 24        # an unsaved upload keeps its blob this long
+
+# ────────────────────────── SCHEMA ───────────────────────────
+def init_blob_store(conn: sqlite3.Connection) -> None:
+    """Create the blob tables and refcount triggers; count existing rows once."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='blobs'"
+    ).fetchone()
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS blobs (
+            content_hash  TEXT PRIMARY KEY,
+            size_bytes    INTEGER NOT NULL,
+            refcount      INTEGER NOT NULL DEFAULT 0,
+            created_at    TEXT NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS file_blobs (
+            filename      TEXT PRIMARY KEY,
+            content_hash  TEXT NOT NULL REFERENCES blobs(content_hash),
+            mapped_at     TEXT
+        ) WITHOUT ROWID
+        """
+    )
+    # mapped_at: set while the upload waits for its document, NULL after;
+    # names mapped before pending uploads were tracked count as settled
+    if not column_exists(conn, "file_blobs", "mapped_at"):
+        conn.execute("ALTER TABLE file_blobs ADD COLUMN mapped_at TEXT")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_file_blobs_content_hash "
+        "ON file_blobs(content_hash)"
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS blobs_refcount_ai AFTER INSERT ON documents
+        BEGIN
+            UPDATE blobs SET refcount = refcount + 1
+            WHERE content_hash = new.content_hash;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS blobs_refcount_ad AFTER DELETE ON documents
+        BEGIN
+            UPDATE blobs SET refcount = refcount - 1
+            WHERE content_hash = old.content_hash;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS blobs_refcount_au
+        AFTER UPDATE OF content_hash ON documents
+        BEGIN
+            UPDATE blobs SET refcount = refcount - 1
+            WHERE content_hash = old.content_hash;
+            UPDATE blobs SET refcount = refcount + 1
+            WHERE content_hash = new.content_hash;
+        END
+        """
+    )
+
+    # a name stops being a pending upload once a document is saved under it
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS file_blobs_settle_ai AFTER INSERT ON documents
+        BEGIN
+            UPDATE file_blobs SET mapped_at = NULL
+            WHERE filename = new.filename AND mapped_at IS NOT NULL;
+        END
+        """
+    )
+
+    if not exists:
+        recount_blobs(conn)
+
+def recount_blobs(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        UPDATE blobs SET refcount = (
+            SELECT COUNT(*) FROM documents d WHERE d.content_hash = blobs.content_hash
+        )
+        """
+    )
+
+# ─────────────────────────── PATHS ───────────────────────────
+def blob_path(root, content_hash: str) -> Path:
+    return Path(root) / content_hash[:2] / content_hash[2:4] / (content_hash + BLOB_SUFFIX)
+
+def hash_for(conn: sqlite3.Connection, filename: str):
+    row = conn.execute(
+        "SELECT content_hash FROM file_blobs WHERE filename = ?", (filename,)
+    ).fetchone()
+    return row[0] if row else None
+
+def local_path(conn: sqlite3.Connection, root, filename: str) -> Path:
+    """Where the PDF uploaded as *filename* lives (blob, or legacy flat file)."""
+    content_hash = hash_for(conn, filename)
+    if content_hash:
+        return blob_path(root, content_hash)
+    return Path(root) / filename
+
+def _name_taken(conn: sqlite3.Connection, root, filename: str, content_hash: str) -> bool:
+    mapped = hash_for(conn, filename)
+    if mapped is not None:
+        return mapped != content_hash
+    return (Path(root) / filename).exists()      # legacy flat upload
+
+def _free_name(conn: sqlite3.Connection, root, filename: str, content_hash: str) -> str:
+    stem, suffix = os.path.splitext(filename)
+    name, i = filename, 1
+    while _name_taken(conn, root, name, content_hash):
+        name = f"{stem}_{i}{suffix}"
+        i += 1
+    return name
+
+# ─────────────────────────── WRITES ──────────────────────────
+def add_file(root, src, content_hash: str, filename: str):
+    """
+    Move the finished file *src* (already hashed) into the store under
+    *filename*. Returns ``(stored_filename, is_new_blob)``; when the
+    content is already stored *src* is simply deleted.
+    """
+    return add_files(root, [(src, content_hash, filename)])[0]
+
+def add_files(root, items):
+    """
+    :func:`add_file` for many ``(src, content_hash, filename)`` at once,
+    in a single transaction (bulk imports); returns one
+    ``(stored_filename, is_new_blob)`` per item.
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        stored = [_store(conn, root, *item) for item in items]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return stored
+
+def _store(conn: sqlite3.Connection, root, src, content_hash: str, filename: str):
+    dest = blob_path(root, content_hash)
+    stored = conn.execute(
+        "SELECT 1 FROM blobs WHERE content_hash = ?", (content_hash,)
+    ).fetchone()
+    is_new = stored is None or not dest.exists()
+    if is_new:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        size = os.path.getsize(src)
+        os.replace(src, dest)
+        conn.execute(
+            """
+            INSERT INTO blobs (content_hash, size_bytes, refcount, created_at)
+            VALUES (?, ?, (SELECT COUNT(*) FROM documents WHERE content_hash = ?), ?)
+            ON CONFLICT(content_hash) DO NOTHING
+            """,
+            (content_hash, size, content_hash,
+             datetime.now().isoformat(timespec="seconds"))
+        )
+    else:
+        os.unlink(src)
+
+    name = _free_name(conn, root, filename, content_hash)
+    conn.execute(
+        """
+        INSERT INTO file_blobs (filename, content_hash, mapped_at) VALUES (?, ?, ?)
+        ON CONFLICT(filename) DO UPDATE SET mapped_at = excluded.mapped_at
+        """,
+        (name, content_hash, datetime.now().isoformat(timespec="seconds"))
+    )
+    return name, is_new
+
+def upload_pending(conn: sqlite3.Connection, content_hash: str) -> bool:
+    """
+    Whether an upload of *content_hash* still waits to become a document:
+    a name mapped in the last ``PENDING_HOURS`` and not saved yet (the
+    confirm page of ``/upload`` or a chunked upload), or a file queued
+    for batch ingest.
+    """
+    since = (datetime.now() - timedelta(hours=PENDING_HOURS)).isoformat(timespec="seconds")
+    if conn.execute(
+        """
+        SELECT 1 FROM file_blobs f
+        WHERE f.content_hash = ? AND f.mapped_at >= ?
+          AND NOT EXISTS (SELECT 1 FROM documents d WHERE d.filename = f.filename)
+        LIMIT 1
+        """,
+        (content_hash, since)
+    ).fetchone():
+        return True
+    queued = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='ingest_job_files'"
+    ).fetchone() and conn.execute(
+        """
+        SELECT 1 FROM ingest_job_files
+        WHERE content_hash = ? AND status IN ('queued', 'running') LIMIT 1
+        """,
+        (content_hash,)
+    ).fetchone()
+    return bool(queued)
+
+def release_unused(conn: sqlite3.Connection, root, content_hash: str) -> bool:
+    """
+    Drop a blob no document uses any more: its file, its names and its
+    row. Call after deleting a document; returns whether it was removed.
+    A blob an upload is still pending on stays.
+    """
+    if not content_hash:
+        return False
+    row = conn.execute(
+        "SELECT refcount FROM blobs WHERE content_hash = ?", (content_hash,)
+    ).fetchone()
+    if row is None or row[0] > 0:
+        return False
+    if upload_pending(conn, content_hash):
+        return False
+    conn.execute("DELETE FROM file_blobs WHERE content_hash = ?", (content_hash,))
+    conn.execute("DELETE FROM blobs WHERE content_hash = ?", (content_hash,))
+    blob_path(root, content_hash).unlink(missing_ok=True)
+    return True
+
+# ───────────────────────── MIGRATION ─────────────────────────
+def migrate_flat_uploads(root) -> tuple:
+    """
+    Move every ``uploads/*.pdf`` into the store, keeping its name.
+    Returns ``(files moved, duplicate files removed)``.
+    """
+    moved = duplicates = 0
+    for path in sorted(Path(root).glob("*.pdf")):
+        content_hash = file_sha256(path)
+        with get_connection() as conn:
+            if hash_for(conn, path.name):
+                continue
+        # the flat file itself would make its own name look taken
+        tmp = path.with_name(path.name + ".migrating")
+        os.replace(path, tmp)
+        try:
+            name, is_new = add_file(root, tmp, content_hash, path.name)
+        except Exception:
+            os.replace(tmp, path)
+            raise
+        if name != path.name:
+            raise RuntimeError(f"{path.name} mapped as {name}")
+        with get_connection() as conn:
+            # documents from before the OCR store carry no hash yet
+            conn.execute(
+                "UPDATE documents SET content_hash = ? "
+                "WHERE filename = ? AND content_hash IS NULL",
+                (content_hash, name)
+            )
+        moved += 1
+        duplicates += not is_new
+    return moved, duplicates
+
+# ──────────────────────────── CLI ────────────────────────────
+def main(argv) -> None:
+    if len(argv) < 2 or argv[1] != "migrate":
+        print(__doc__)
+        sys.exit(2)
+    root = argv[2] if len(argv) > 2 else UPLOAD_FOLDER
+
+    with get_connection() as conn:
+        init_blob_store(conn)
+    moved, duplicates = migrate_flat_uploads(root)
+    print(f"✅ {moved} files moved into {root}/ab/cd/<sha256>.pdf "
+          f"({duplicates} duplicate contents stored once)")
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv)
+    except Exception as exc:
+        print("❌ Something went wrong:", exc, file=sys.stderr)
+        sys.exit(1)
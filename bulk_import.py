@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+bulk_import.py
+-------------------------------------------------
+Headless bulk import of a folder tree of PDFs into the Arsip archive
+(replaces the tkinter importer, which copied files one by one and
+never OCR'd them).
+
+• Walks the source tree for ``*.pdf`` and hashes every file
+• Skips files whose content is already archived
+• Copies the rest into the content-addressed store under ``uploads/``
+  (see ``blob_store``; a clashing name gets a free variant)
+• OCRs them on the process pool (``OCR_WORKERS``), reusing the OCR cache;
+  blob names and cache entries are written once per OCR batch
+• Inserts the documents ``BULK_CHUNK_ROWS`` per transaction, across
+  batches (see ``document_store.BulkInserter``); a file whose OCR failed
+  or is quarantined is imported with empty notes and the reason is kept
+  in ``ocr_failures`` (the manifest entry carries it as ``ocr_error``)
+
+Every finished file is appended to a manifest (JSON lines), so an
+interrupted run started again with the same arguments resumes where it
+stopped. ``--dry-run`` writes nothing: it times hashing and OCR on a
+small sample and estimates how long the full import would take.
+
+The database is ``database.db`` or ``$ARSIP_DB``.
+
+Run: python bulk_import.py SOURCE_DIR [--company-type PT]
+                           [--company-name NAME] [--category NAME]
+                           [--uploads uploads] [--manifest import_manifest.jsonl]
+                           [--dry-run]
+"""
+
+from pathlib import Path
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from blob_store import add_files, blob_path, init_blob_store
+from db import get_connection
+from document_store import BulkInserter, init_document_store
+from ocr_engine import OcrEngine
+from ocr_failures import init_ocr_failures
+from ocr_service import ocr_uploads, extract
+from ocr_store import init_ocr_store, file_sha256
+from upload_store import INCOMING_DIR
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+COMPANY_TYPES    = ['PT', 'CV', 'UD', 'Koperasi', 'Yayasan']
+DEFAULT_MANIFEST = "import_manifest.jsonl"
+BATCH_FACTOR     = 4      # files per OCR batch = workers × factor
+SAMPLE_FILES     = 8      # dry run: hashed files used to measure throughput
+BAR_WIDTH        = 30
+
+# ───────────────────────── MANIFEST ──────────────────────────
+def source_key(path: Path) -> str:
+    """Identifies a source file across runs: path, size and mtime."""
+    st = path.stat()
+    return f"{path.resolve()}|{st.st_size}|{int(st.st_mtime)}"
+
+def load_manifest(manifest: Path) -> set:
+    """Keys of source files a previous run already finished."""
+    done = set()
+    if not manifest.exists():
+        return done
+    with manifest.open(encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue            # torn last line of a killed run
+            if entry.get("status") in ("done", "duplicate"):
+                done.add(entry["key"])
+    return done
+
+def append_manifest(fh, entries) -> None:
+    for entry in entries:
+        fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    fh.flush()
+    os.fsync(fh.fileno())
+
+# ────────────────────────── PROGRESS ─────────────────────────
+def format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rest = divmod(seconds, 3600)
+    return f"{h}:{rest // 60:02d}:{rest % 60:02d}" if h else f"{rest // 60}:{rest % 60:02d}"
+
+def show_progress(done: int, total: int, started: float) -> None:
+    elapsed = time.monotonic() - started
+    rate = done / elapsed if elapsed else 0
+    filled = int(BAR_WIDTH * done / total) if total else BAR_WIDTH
+    eta = format_seconds((total - done) / rate) if rate else "?"
+    sys.stderr.write(
+        f"\r[{'#' * filled}{'.' * (BAR_WIDTH - filled)}] {done}/{total}"
+        f"  {rate * 60:.1f} files/min  ETA {eta} "
+    )
+    sys.stderr.flush()
+
+# ─────────────────────────── IMPORT ──────────────────────────
+def find_pdfs(source: Path) -> list:
+    return sorted(p for p in source.rglob("*") if p.is_file() and p.suffix.lower() == ".pdf")
+
+def store_copies(uploads: Path, items) -> list:
+    """
+    Copy every ``(source, content_hash)`` into the blob store, recording
+    them in one transaction; returns the names they were mapped as.
+    """
+    incoming = uploads / INCOMING_DIR
+    incoming.mkdir(parents=True, exist_ok=True)
+    staged = []
+    try:
+        for source, content_hash in items:
+            fd, tmp = tempfile.mkstemp(suffix=".part", dir=incoming)
+            os.close(fd)
+            staged.append((tmp, content_hash, source.name))
+            shutil.copy2(source, tmp)
+        stored = add_files(uploads, staged)
+    except Exception:
+        for tmp, _, _ in staged:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        raise
+    return [name for name, _ in stored]
+
+def archived_hashes(conn) -> set:
+    return {row[0] for row in conn.execute(
+        "SELECT content_hash FROM documents WHERE content_hash IS NOT NULL"
+    )}
+
+def import_batch(batch, uploads: Path, metadata: dict, engine: OcrEngine,
+                 known: set, bulk: BulkInserter, entries: list) -> dict:
+    """
+    Hash, copy and OCR one batch of ``(key, source)`` pairs and hand the
+    documents to *bulk*, which commits them ``BULK_CHUNK_ROWS`` at a time
+    across batches. Manifest entries go to *entries* once committed.
+    """
+    counts = {"duplicate": 0, "ocr_failed": 0}
+    todo = []
+
+    for key, source in batch:
+        content_hash = file_sha256(source)
+        if content_hash in known:
+            counts["duplicate"] += 1
+            entries.append({"key": key, "status": "duplicate", "sha256": content_hash})
+            continue
+        known.add(content_hash)
+        todo.append((key, source, content_hash))
+
+    names = store_copies(uploads, [(source, h) for _, source, h in todo])
+    results = ocr_uploads(
+        [blob_path(uploads, h) for _, _, h in todo], engine,
+        hashes=[h for _, _, h in todo]
+    )
+
+    for (key, _, content_hash), name, (_, _, notes, error) in zip(todo, names, results):
+        if error:
+            # the PDF is archived anyway; only its text is missing
+            counts["ocr_failed"] += 1
+            print(f"\n⚠️ {name}: OCR gagal: {error}", file=sys.stderr)
+        bulk.add(
+            dict(metadata, filename=name, notes=notes.strip(),
+                 content_hash=content_hash),
+            tag=(key, name, content_hash, error)
+        )
+    return counts
+
+def run_import(todo, uploads: Path, metadata: dict, manifest: Path) -> dict:
+    engine = OcrEngine()
+    batch_size = engine.max_workers * BATCH_FACTOR
+    totals = {"done": 0, "duplicate": 0, "ocr_failed": 0}
+    with get_connection() as conn:
+        known = archived_hashes(conn)
+    entries = []
+
+    def record_chunk(conn, doc_ids, tags):
+        for doc_id, (key, name, content_hash, error) in zip(doc_ids, tags):
+            entry = {"key": key, "status": "done", "sha256": content_hash,
+                     "filename": name, "doc_id": doc_id}
+            if error:
+                entry["ocr_error"] = error
+            entries.append(entry)
+
+    started = time.monotonic()
+    show_progress(0, len(todo), started)
+    bulk = BulkInserter(get_connection(), on_chunk=record_chunk)
+    try:
+        with manifest.open("a", encoding="utf-8") as fh:
+            for i in range(0, len(todo), batch_size):
+                counts = import_batch(todo[i:i + batch_size], uploads, metadata,
+                                      engine, known, bulk, entries)
+                for k, v in counts.items():
+                    totals[k] += v
+                append_manifest(fh, entries)
+                entries.clear()
+                show_progress(min(i + batch_size, len(todo)), len(todo), started)
+            bulk.flush()
+            append_manifest(fh, entries)
+    finally:
+        engine.shutdown()
+        sys.stderr.write("\n")
+    totals["done"] = bulk.total
+    return totals
+
+# ────────────────────────── DRY RUN ──────────────────────────
+def _estimate_task(path):
+    """Runs in the pool: OCR without touching the database's stats."""
+    return extract(path, stats=None)
+
+def estimate(todo) -> None:
+    """Time hashing and OCR on a sample and extrapolate to all *todo* files."""
+    total_bytes = sum(source.stat().st_size for _, source in todo)
+    sample = [source for _, source in todo[:SAMPLE_FILES]]
+    engine = OcrEngine()
+
+    started = time.monotonic()
+    sample_bytes = 0
+    for source in sample:
+        file_sha256(source)
+        sample_bytes += source.stat().st_size
+    hash_rate = sample_bytes / max(time.monotonic() - started, 1e-6)
+
+    # One file per worker keeps the pool busy exactly once
+    ocr_sample = sample[:engine.max_workers]
+    started = time.monotonic()
+    try:
+        failed = sum(1 for outcome in engine.run(ocr_sample, _estimate_task)
+                     if outcome.error or outcome.text.error)
+    finally:
+        engine.shutdown()
+    ocr_rate = len(ocr_sample) / max(time.monotonic() - started, 1e-6)
+
+    seconds = total_bytes / hash_rate * 2 + len(todo) / ocr_rate   # hash + copy, OCR
+    print(f"📄 Files to import : {len(todo)} ({total_bytes / 1024 / 1024:.1f} MB)")
+    print(f"⏱️  Hashing        : {hash_rate / 1024 / 1024:.1f} MB/s")
+    print(f"⏱️  OCR            : {ocr_rate * 60:.1f} files/min on {engine.max_workers} workers"
+          + (f" ({failed} sample files failed)" if failed else ""))
+    print(f"⏳ Estimated time  : {format_seconds(seconds)} "
+          f"(less for files already in the OCR cache)")
+
+# ──────────────────────────── CLI ────────────────────────────
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Bulk import PDFs into the Arsip archive.")
+    parser.add_argument("source", type=Path, help="folder to import (searched recursively)")
+    parser.add_argument("--company-type", default="", choices=[""] + COMPANY_TYPES)
+    parser.add_argument("--company-name", default="")
+    parser.add_argument("--category", default="")
+    parser.add_argument("--uploads", type=Path, default=Path("uploads"))
+    parser.add_argument("--manifest", type=Path, default=Path(DEFAULT_MANIFEST))
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only estimate the import time, change nothing")
+    return parser.parse_args(argv)
+
+def main(argv) -> None:
+    args = parse_args(argv)
+    if not args.source.is_dir():
+        raise RuntimeError(f"Folder sumber tidak ditemukan: {args.source}")
+
+    finished = load_manifest(args.manifest)
+    pdfs = find_pdfs(args.source)
+    todo = [(key, p) for key, p in ((source_key(p), p) for p in pdfs) if key not in finished]
+    print(f"⚙️  {len(pdfs)} PDF found, {len(pdfs) - len(todo)} already imported (manifest)")
+    if not todo:
+        print("✅ Nothing to do.")
+        return
+
+    if args.dry_run:
+        estimate(todo)
+        return
+
+    with get_connection() as conn:
+        init_ocr_store(conn)
+        init_blob_store(conn)
+        init_document_store(conn)
+        init_ocr_failures(conn)
+    args.uploads.mkdir(parents=True, exist_ok=True)
+
+    metadata = {
+        "company_type": args.company_type,
+        "company_name": args.company_name.strip(),
+        "category":     args.category.strip(),
+    }
+    totals = run_import(todo, args.uploads, metadata, args.manifest)
+    print(f"✅ Imported {totals['done']} ({totals['ocr_failed']} without OCR text), "
+          f"skipped {totals['duplicate']} duplicates. Manifest: {args.manifest}")
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv[1:])
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted; run the same command again to resume.", file=sys.stderr)
+        sys.exit(130)
+    except Exception as exc:
+        print("❌ Something went wrong:", exc, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,228 @@
+"""
+chunked_upload.py
+-------------------------------------------------
+Resumable uploads for large scans (50–200 MB Akta) over a slow link.
+
+Instead of one multipart POST that restarts from zero when the
+connection drops, the browser:
+
+1. ``POST /upload/sessions``  ``{"filename", "size"}`` → ``{"id", "offset", "chunk_size"}``
+2. ``PUT  /upload/sessions/<id>`` with an ``Upload-Offset`` header, an
+   ``Upload-Checksum: crc32 <hex>`` header and the raw chunk bytes as
+   body → ``{"offset"}``; a chunk whose offset does not match what the
+   server already has gets ``409`` with the real offset, so the client
+   simply continues from there, and one whose CRC-32 does not match the
+   bytes received is dropped with ``422`` and sent again
+3. ``GET  /upload/sessions/<id>`` → ``{"offset", "size"}`` after a
+   reconnect, to find out where to resume
+4. ``POST /upload/sessions/<id>/finalize`` ``{"sha256"}`` → the server
+   checks the size and, when the client sent one, the SHA-256 of the
+   assembled file, stores the file like ``/upload`` does
+   (``blob_store``), OCRs it and returns ``{"confirm_url"}`` for the
+   usual metadata confirmation page.
+
+Every byte of the assembled file was checked against its chunk's CRC-32
+as it arrived, so the integrity check doesn't depend on WebCrypto (not
+available to plain-HTTP pages) and the browser never has to read the
+whole file into memory; the optional SHA-256 is for API clients.
+
+Chunks are written into ``uploads/.incoming/<id>.part``; progress lives
+in ``upload_sessions`` so any gunicorn worker can take the next chunk.
+Sessions idle for a day are swept with the other leftover temp files.
+"""
+
+from flask import Blueprint, request, jsonify, current_app, url_for, abort
+from datetime import datetime
+from pathlib import Path
+import hmac
+import os
+import sqlite3
+import uuid
+import zlib
+
+from db import get_connection
+from ocr_store import file_sha256
+from upload_store import MAX_FILE_BYTES, INCOMING_DIR, STALE_AFTER
+from blob_store import add_file, blob_path
+import ocr_service
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+CHUNK_SIZE      = 8 * 1024 * 1024      # suggested to clients
+MAX_CHUNK_BYTES = 32 * 1024 * 1024     # largest PUT body accepted
+COPY_BLOCK      = 1024 * 1024
+CHECKSUM_ALGO   = "crc32"              # Upload-Checksum: crc32 <8 hex digits>
+
+# ──────────────────────── BLUEPRINT SETUP ─────────────────────
+chunked_upload_bp = Blueprint("chunked_upload_bp", __name__)
+
+# ────────────────────────── SCHEMA ───────────────────────────
+def init_upload_sessions(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id          TEXT PRIMARY KEY,
+            filename    TEXT NOT NULL,
+            size        INTEGER NOT NULL,
+            received    INTEGER NOT NULL DEFAULT 0,
+            created_at  TEXT NOT NULL,
+            updated_at  REAL NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+
+# ────────────────────────── HELPERS ──────────────────────────
+def _part_path(session_id: str) -> Path:
+    return Path(current_app.config["UPLOAD_FOLDER"]) / INCOMING_DIR / f"{session_id}.part"
+
+def _load(conn: sqlite3.Connection, session_id: str):
+    row = conn.execute(
+        "SELECT filename, size, received FROM upload_sessions WHERE id = ?",
+        (session_id,)
+    ).fetchone()
+    if row is None:
+        abort(404)
+    if not _part_path(session_id).exists():
+        # swept as stale, or the worker's disk was wiped
+        conn.execute("DELETE FROM upload_sessions WHERE id = ?", (session_id,))
+        conn.commit()
+        abort(410)
+    return row
+
+def _chunk_checksum(header: str):
+    """The CRC-32 from an ``Upload-Checksum`` header, or ``None``."""
+    algo, _, value = header.strip().partition(" ")
+    if algo.lower() != CHECKSUM_ALGO:
+        return None
+    try:
+        return int(value.strip(), 16)
+    except ValueError:
+        return None
+
+def _error(message: str, status: int, **extra):
+    return jsonify(error=message, **extra), status
+
+def expire_sessions(conn: sqlite3.Connection) -> int:
+    """Forget sessions idle longer than the temp-file sweep keeps their data."""
+    cur = conn.execute(
+        "DELETE FROM upload_sessions WHERE updated_at < ?",
+        (datetime.now().timestamp() - STALE_AFTER,)
+    )
+    return cur.rowcount
+
+# ─────────────────────────── ROUTES ──────────────────────────
+@chunked_upload_bp.route("/upload/sessions", methods=["POST"])
+def create_session():
+    data = request.get_json(silent=True) or {}
+    filename = os.path.basename(str(data.get("filename", ""))).strip()
+    try:
+        size = int(data.get("size"))
+    except (TypeError, ValueError):
+        return _error("size wajib diisi", 400)
+    if not filename.lower().endswith(".pdf"):
+        return _error("Only PDF files are supported.", 400)
+    if not 0 < size <= MAX_FILE_BYTES:
+        return _error(f"File lebih besar dari {MAX_FILE_BYTES // 1024 // 1024} MB.", 413)
+
+    session_id = uuid.uuid4().hex
+    part = _part_path(session_id)
+    part.parent.mkdir(parents=True, exist_ok=True)
+    part.touch()
+    with get_connection() as conn:
+        expire_sessions(conn)
+        conn.execute(
+            """
+            INSERT INTO upload_sessions (id, filename, size, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (session_id, filename, size,
+             datetime.now().isoformat(timespec="seconds"), datetime.now().timestamp())
+        )
+    return jsonify(id=session_id, offset=0, size=size, chunk_size=CHUNK_SIZE), 201
+
+@chunked_upload_bp.route("/upload/sessions/<session_id>", methods=["GET"])
+def session_status(session_id):
+    with get_connection() as conn:
+        filename, size, received = _load(conn, session_id)
+    return jsonify(id=session_id, filename=filename, size=size, offset=received)
+
+@chunked_upload_bp.route("/upload/sessions/<session_id>", methods=["PUT"])
+def put_chunk(session_id):
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return _error("Upload-Offset header wajib diisi", 400)
+    length = request.content_length
+    if length is None or not 0 < length <= MAX_CHUNK_BYTES:
+        return _error("Content-Length tidak valid", 400)
+    checksum = _chunk_checksum(request.headers.get("Upload-Checksum", ""))
+    if checksum is None:
+        return _error("Upload-Checksum header (crc32) wajib diisi", 400)
+
+    with get_connection() as conn:
+        _, size, received = _load(conn, session_id)
+    if offset != received:
+        return _error("offset mismatch", 409, offset=received)
+    if offset + length > size:
+        return _error("chunk melebihi ukuran file", 400, offset=received)
+
+    # Stream the body to disk; no lock is held while the bytes arrive
+    written, crc = 0, 0
+    with open(_part_path(session_id), "r+b") as fh:
+        fh.seek(offset)
+        while written < length:
+            block = request.stream.read(min(COPY_BLOCK, length - written))
+            if not block:
+                break
+            fh.write(block)
+            written += len(block)
+            crc = zlib.crc32(block, crc)
+        # only a complete, intact chunk is kept
+        intact = written == length and crc == checksum
+        fh.truncate(offset + written if intact else offset)
+    if written != length:
+        return _error("koneksi terputus", 400, offset=received)
+    if crc != checksum:
+        return _error("checksum chunk tidak cocok", 422, offset=received)
+
+    with get_connection() as conn:
+        cur = conn.execute(
+            """
+            UPDATE upload_sessions SET received = ?, updated_at = ?
+            WHERE id = ? AND received = ?
+            """,
+            (offset + written, datetime.now().timestamp(), session_id, received)
+        )
+    if cur.rowcount == 0:
+        # another request for the same session won the race
+        with get_connection() as conn:
+            _, _, received = _load(conn, session_id)
+        return _error("offset mismatch", 409, offset=received)
+    return jsonify(offset=offset + written)
+
+@chunked_upload_bp.route("/upload/sessions/<session_id>/finalize", methods=["POST"])
+def finalize(session_id):
+    expected = str((request.get_json(silent=True) or {}).get("sha256", "")).lower()
+    with get_connection() as conn:
+        filename, size, received = _load(conn, session_id)
+    if received != size:
+        return _error("upload belum lengkap", 409, offset=received)
+
+    part = _part_path(session_id)
+    content_hash = file_sha256(part)
+    if expected and not hmac.compare_digest(content_hash, expected):
+        # corrupt assembly: start over rather than archive a broken scan
+        part.unlink(missing_ok=True)
+        with get_connection() as conn:
+            conn.execute("DELETE FROM upload_sessions WHERE id = ?", (session_id,))
+        return _error("checksum tidak cocok", 422, sha256=content_hash)
+
+    root = current_app.config["UPLOAD_FOLDER"]
+    name, _ = add_file(root, part, content_hash, filename)
+    with get_connection() as conn:
+        conn.execute("DELETE FROM upload_sessions WHERE id = ?", (session_id,))
+
+    ocr_service.ocr_upload(blob_path(root, content_hash), content_hash)
+    return jsonify(
+        filename=name, sha256=content_hash,
+        confirm_url=url_for("confirm_upload", filename=name)
+    )
@@ -0,0 +1,94 @@
+"""
+data_version.py
+-------------------------------------------------
+Conditional GET for the ``/documents`` list page.
+
+``data_version`` is a single-row counter that triggers on ``documents``
+bump on every insert, update and delete, whoever the writer is (web
+app, ingest worker, bulk import). The list page's ETag is built from
+that counter plus the query string, so a refresh with nothing changed
+costs one primary-key lookup and a ``304`` — no list query, no facets,
+no Jinja.
+
+The ETag also carries the modification time of the templates and the
+stylesheet, so a deploy that changes the page invalidates old copies.
+"""
+
+from flask import Response, request
+from datetime import datetime, timezone
+from pathlib import Path
+import hashlib
+import sqlite3
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+BASE_DIR = Path(__file__).resolve().parent
+RENDER_INPUTS = [*(BASE_DIR / "templates").glob("*.html"), BASE_DIR / "static" / "style.css"]
+RENDER_SALT = format(int(max((p.stat().st_mtime for p in RENDER_INPUTS if p.exists()),
+                             default=0)), "x")
+
+# ────────────────────────── SCHEMA ───────────────────────────
+def init_data_version(conn: sqlite3.Connection) -> None:
+    """Create the counter row and the triggers that bump it."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS data_version (
+            id          INTEGER PRIMARY KEY CHECK (id = 1),
+            version     INTEGER NOT NULL,
+            changed_at  INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO data_version (id, version, changed_at) "
+        "VALUES (1, 1, CAST(strftime('%s', 'now') AS INTEGER))"
+    )
+    for suffix, event in (("ai", "INSERT"), ("ad", "DELETE"), ("au", "UPDATE")):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS data_version_{suffix} AFTER {event} ON documents
+            BEGIN
+                UPDATE data_version
+                SET version = version + 1,
+                    changed_at = CAST(strftime('%s', 'now') AS INTEGER)
+                WHERE id = 1;
+            END
+            """
+        )
+
+# ────────────────────────── QUERIES ──────────────────────────
+def current(conn: sqlite3.Connection):
+    """``(version, changed_at)``; read before the list query, never after."""
+    version, changed_at = conn.execute(
+        "SELECT version, changed_at FROM data_version WHERE id = 1"
+    ).fetchone()
+    return version, datetime.fromtimestamp(changed_at, timezone.utc)
+
+def list_etag(version: int) -> str:
+    """Per-page ETag: data version, normalized query string, template build."""
+    args = sorted(request.args.items(multi=True))
+    digest = hashlib.sha1(repr(args).encode("utf-8")).hexdigest()[:16]
+    return f"{version}-{digest}-{RENDER_SALT}"
+
+# ─────────────────────────── HTTP ────────────────────────────
+def _validators(response: Response, etag: str, last_modified: datetime) -> Response:
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True      # always ask, usually get a 304
+    return response
+
+def not_modified(etag: str, last_modified: datetime):
+    """A ``304`` if the browser's copy is current, else ``None``."""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since:
+        fresh = request.if_modified_since >= last_modified
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    return _validators(Response(status=304), etag, last_modified)
+
+def with_validators(body, etag: str, last_modified: datetime) -> Response:
+    """Attach the ETag and Last-Modified of a freshly rendered page."""
+    return _validators(Response(body, mimetype="text/html"), etag, last_modified)
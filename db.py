@@ -0,0 +1,77 @@
+"""
+db.py
+-------------------------------------------------
+Shared SQLite access for the Arsip app, its blueprints and CLIs.
+
+Each thread keeps one connection for its whole life instead of opening
+``database.db`` per helper call. Connections run in WAL mode, so the
+list page keeps reading while the ingest worker writes, and wait up to
+``busy_timeout`` for a competing writer instead of failing with
+"database is locked".
+
+Use it exactly like the old ``sqlite3.connect`` context manager; the
+``with`` block commits on success and rolls back on error, but the
+connection stays open for the next caller on this thread::
+
+    with get_connection() as conn:
+        conn.execute(...)
+
+Configuration (environment variables):
+    ARSIP_DB                 database file, default database.db
+    SQLITE_JOURNAL_MODE      default WAL
+    SQLITE_SYNCHRONOUS       default NORMAL (safe with WAL, one fsync
+                             per checkpoint instead of per commit)
+    SQLITE_BUSY_TIMEOUT_MS   default 5000
+    SQLITE_CACHE_SIZE_KB     page cache per connection, default 16384
+    SQLITE_MMAP_SIZE_MB      memory-mapped I/O window, default 128
+"""
+
+import os
+import sqlite3
+import threading
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+DB_FILE = os.environ.get("ARSIP_DB", "database.db")
+
+PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous":  os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    # negative cache_size is in KiB rather than pages
+    "cache_size":   -int(os.environ.get("SQLITE_CACHE_SIZE_KB", "16384")),
+    "mmap_size":    int(os.environ.get("SQLITE_MMAP_SIZE_MB", "128")) * 1024 * 1024,
+    "temp_store":   "MEMORY",
+    "foreign_keys": "ON",
+}
+
+# ──────────────────────── CONNECTIONS ────────────────────────
+def configure(conn: sqlite3.Connection) -> sqlite3.Connection:
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+def connect(path=None) -> sqlite3.Connection:
+    """A new, tuned connection that the caller owns (CLIs, scripts)."""
+    return configure(sqlite3.connect(path or DB_FILE))
+
+_local = threading.local()
+
+def get_connection() -> sqlite3.Connection:
+    """
+    This thread's connection, opened on first use. A process forked from
+    a parent that already had one (OCR pool children) opens its own.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = connect()
+        _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+def release() -> None:
+    """
+    Call at the end of a request: roll back anything a failed handler
+    left open so the next request on this thread starts clean.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid() and conn.in_transaction:
+        conn.rollback()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+db_indexes.py
+-------------------------------------------------
+Secondary indexes behind the ``/documents`` filters and sort orders,
+plus a query-plan check that proves they are used.
+
+Every filter is an equality on category / company_type / company_name
+and/or a range on issued_date; every sort is ``(column, id)``. Because
+``id`` is the rowid, an index on ``(x)`` is already ordered by
+``(x, id)`` and serves the keyset pagination for sort-by-x directly,
+and ``(x, issued_date)`` serves "filter on x, date range / sort by date".
+
+``init_db`` calls :func:`ensure_indexes`. The check builds the exact SQL
+of the list view for every filter × sort combination, runs
+``EXPLAIN QUERY PLAN`` and reports the combinations that still scan the
+whole ``documents`` table:
+
+Run: python db_indexes.py check [path/to/database.db] [-v]
+"""
+
+from itertools import product
+import argparse
+import sqlite3
+import sys
+
+from db import DB_FILE, connect
+
+import document_store
+from ocr_store import init_ocr_store
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+# name → indexed columns of ``documents``
+MANAGED_INDEXES = {
+    "idx_documents_filename":          ("filename",),
+    "idx_documents_category":          ("category",),
+    "idx_documents_company_type":      ("company_type",),
+    "idx_documents_company_name":      ("company_name",),
+    "idx_documents_issued_date":       ("issued_date",),
+    "idx_documents_category_date":     ("category", "issued_date"),
+    "idx_documents_company_type_date": ("company_type", "issued_date"),
+    "idx_documents_company_name_date": ("company_name", "issued_date"),
+}
+
+SORTS = ["id", "filename", "category", "company_type", "company_name", "issued_date"]
+FILTER_SETS = [
+    {},
+    {"category": "x"},
+    {"company_type": "x"},
+    {"company_name": "x"},
+    {"date_from": "2000-01-01", "date_to": "2100-01-01"},
+    {"category": "x", "date_from": "2000-01-01"},
+    {"company_type": "x", "company_name": "x"},
+    {"company_name": "x", "date_from": "2000-01-01", "date_to": "2100-01-01"},
+]
+
+# ────────────────────────── INDEXES ──────────────────────────
+def ensure_indexes(conn: sqlite3.Connection) -> None:
+    for name, cols in MANAGED_INDEXES.items():
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON documents({', '.join(cols)})"
+        )
+    # Refresh planner statistics where they are stale or missing
+    conn.execute("PRAGMA optimize")
+
+# ─────────────────────────── CHECK ───────────────────────────
+def _is_full_scan(detail: str) -> bool:
+    return detail.startswith("SCAN documents") and "INDEX" not in detail
+
+def check_query_plans(conn: sqlite3.Connection, verbose: bool = False):
+    """
+    Returns ``[(description, plan_lines)]`` for every list query whose
+    plan contains a full scan of ``documents``. The unfiltered id sort is
+    exempt: walking the rowid in order under a LIMIT is already optimal.
+    """
+    problems = []
+    for filters, sort_by, sort_dir in product(FILTER_SETS, SORTS, ["asc", "desc"]):
+        sql, params, _ = document_store.build_list_query(
+            filters, "", sort_by, sort_dir, per_page=50
+        )
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        label = f"filters={sorted(filters)} sort={sort_by} {sort_dir}"
+        if verbose:
+            print(label, "→", " | ".join(plan))
+
+        exempt = not filters and sort_by == "id"
+        if not exempt and any(_is_full_scan(d) for d in plan):
+            problems.append((label, plan))
+    return problems
+
+# ──────────────────────────── CLI ────────────────────────────
+def main(argv) -> None:
+    parser = argparse.ArgumentParser(description="Check that list queries use an index.")
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("db", nargs="?", default=DB_FILE)
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="print the query plan of every combination")
+    args = parser.parse_args(argv)
+    db_path, verbose = args.db, args.verbose
+
+    with connect(db_path) as conn:
+        # the columns the list query selects, on a DB the app hasn't migrated yet
+        init_ocr_store(conn)
+        document_store.init_document_store(conn)
+        ensure_indexes(conn)
+        problems = check_query_plans(conn, verbose)
+
+    if not problems:
+        print(f"✅ All list queries use an index ({db_path})")
+        return
+    for label, plan in problems:
+        print(f"❌ {label}")
+        for line in plan:
+            print(f"     {line}")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv[1:])
+    except SystemExit:
+        raise
+    except Exception as exc:
+        print("❌ Something went wrong:", exc, file=sys.stderr)
+        sys.exit(1)
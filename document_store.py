@@ -0,0 +1,203 @@
+"""
+document_store.py
+-------------------------------------------------
+Column layout and list query for the ``documents`` table.
+
+The list page only shows a short "Catatan" cell, but ``notes`` holds
+the full OCR text of the first page. A whitespace-collapsed, truncated
+copy is therefore precomputed into ``notes_preview`` whenever notes are
+written, and the list query selects :data:`LIST_COLUMNS` only; the full
+text is fetched on demand from ``/documents/<id>/notes``.
+
+New rows go through :func:`insert_documents`; bulk imports buffer them
+in a :class:`BulkInserter`, which writes ``BULK_CHUNK_ROWS`` documents
+per transaction (one fsync per chunk instead of one per file).
+"""
+
+import sqlite3
+
+import pagination
+import search_index
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+PREVIEW_CHARS   = 160
+ELLIPSIS        = "…"
+BULK_CHUNK_ROWS = 500
+
+# Everything list_documents.html renders, and nothing more
+LIST_COLUMNS = (
+    "documents.id, documents.filename, documents.category, "
+    "documents.company_type, documents.company_name, "
+    "documents.issued_date, documents.notes_preview, documents.content_hash"
+)
+
+# ────────────────────────── SCHEMA ───────────────────────────
+def init_document_store(conn: sqlite3.Connection) -> None:
+    """Add ``notes_preview`` and fill it for rows written by older code."""
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+    if "notes_preview" not in cols:
+        conn.execute("ALTER TABLE documents ADD COLUMN notes_preview TEXT")
+
+    missing = conn.execute(
+        "SELECT id, notes FROM documents WHERE notes_preview IS NULL"
+    ).fetchall()
+    conn.executemany(
+        "UPDATE documents SET notes_preview = ? WHERE id = ?",
+        [(notes_preview(notes), doc_id) for doc_id, notes in missing]
+    )
+
+# ─────────────────────────── LISTING ─────────────────────────
+def build_list_query(filters: dict, match: str, sort_by: str, sort_dir: str,
+                     per_page: int, after=None, before=None):
+    """
+    SQL for one page of ``/documents``. *filters* holds the view's
+    category / company_type / company_name / date_from / date_to values
+    (empty = no filter); *match* is an FTS5 query or ``""``.
+    Returns ``(sql, params, seek)``; the query fetches ``per_page + 1``
+    rows so :func:`pagination.paginate` can tell whether more follow.
+    Kept separate from the view so ``db_indexes`` can EXPLAIN it.
+    """
+    where, params = [], []
+    if match:                        where.append("documents_fts MATCH ?");         params.append(match)
+    if filters.get('category'):      where.append("documents.category = ?");        params.append(filters['category'])
+    if filters.get('company_type'):  where.append("documents.company_type = ?");    params.append(filters['company_type'])
+    if filters.get('company_name'):  where.append("documents.company_name = ?");    params.append(filters['company_name'])
+    if filters.get('date_from'):     where.append("documents.issued_date >= ?");    params.append(filters['date_from'])
+    if filters.get('date_to'):       where.append("documents.issued_date <= ?");    params.append(filters['date_to'])
+
+    sort_expr = search_index.RANK_SQL if sort_by == 'rank' else f"documents.{sort_by}"
+    page_seek = pagination.seek(sort_expr, "documents.id", sort_dir, after, before)
+    if page_seek.where:
+        where.append(page_seek.where); params.extend(page_seek.params)
+
+    if match:
+        # Full-text search: BM25-ranked, with a highlighted snippet
+        sql = (f"SELECT {LIST_COLUMNS}, {search_index.SNIPPET_SQL} AS snippet, "
+               f"{sort_expr} AS sort_key FROM {search_index.JOIN_SQL}")
+    else:
+        sql = f"SELECT {LIST_COLUMNS}, {sort_expr} AS sort_key FROM documents"
+    if where: sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {page_seek.order_by} LIMIT ?"
+    params.append(per_page + 1)
+    return sql, params, page_seek
+
+# ─────────────────────────── WRITES ──────────────────────────
+# Columns written on insert; notes_preview is derived from notes
+INSERT_COLUMNS = (
+    "filename", "category", "doc_type", "company_type",
+    "company_name", "issued_date", "notes", "content_hash",
+)
+INSERT_SQL = (
+    f"INSERT INTO documents ({', '.join(INSERT_COLUMNS)}, notes_preview) "
+    f"VALUES ({', '.join('?' * (len(INSERT_COLUMNS) + 1))})"
+)
+
+def document_row(record: dict) -> tuple:
+    """Parameters for :data:`INSERT_SQL`; missing metadata is stored as ''."""
+    values = [record.get(col) or "" for col in INSERT_COLUMNS]
+    values[INSERT_COLUMNS.index("content_hash")] = record.get("content_hash")
+    return (*values, notes_preview(record.get("notes")))
+
+def insert_documents(conn: sqlite3.Connection, records) -> list:
+    """
+    Insert *records* (dicts keyed by :data:`INSERT_COLUMNS`) with one
+    ``executemany`` and return their new ids in order. Runs inside the
+    caller's transaction, which must hold the write lock for the ids to
+    be exact (``BEGIN IMMEDIATE``, or a single-row insert).
+    """
+    records = list(records)
+    if not records:
+        return []
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM documents").fetchone()[0]
+    conn.executemany(INSERT_SQL, [document_row(r) for r in records])
+    ids = [row[0] for row in conn.execute(
+        "SELECT id FROM documents WHERE id > ? ORDER BY id", (last_id,)
+    )]
+    if len(ids) != len(records):
+        raise sqlite3.DatabaseError(
+            f"expected {len(records)} new documents, found {len(ids)}"
+        )
+    return ids
+
+class BulkInserter:
+    """
+    Buffers document records and writes them ``chunk_size`` at a time,
+    each chunk in its own ``BEGIN IMMEDIATE`` transaction: a chunk is
+    either fully stored or not at all.
+
+    *on_chunk(conn, ids, tags)* runs inside that transaction after the
+    insert, so callers can record where each document went atomically
+    with it; *tags* are the values passed to :meth:`add`. Use as a
+    context manager to flush the last, partial chunk::
+
+        with BulkInserter(conn) as bulk:
+            for record in records:
+                bulk.add(record)
+        print(bulk.chunk_counts)    # e.g. [500, 500, 137]
+    """
+
+    def __init__(self, conn: sqlite3.Connection,
+                 chunk_size: int = BULK_CHUNK_ROWS, on_chunk=None):
+        self.conn = conn
+        self.chunk_size = max(1, chunk_size)
+        self.on_chunk = on_chunk
+        self.chunk_counts = []      # rows committed per chunk
+        self._records, self._tags = [], []
+
+    @property
+    def total(self) -> int:
+        return sum(self.chunk_counts)
+
+    @property
+    def pending_tags(self) -> list:
+        """Tags of buffered records not yet committed (e.g. after a failed flush)."""
+        return list(self._tags)
+
+    def add(self, record: dict, tag=None) -> None:
+        self._records.append(record)
+        self._tags.append(tag)
+        if len(self._records) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """Commit the buffered records as one chunk; returns its row count."""
+        if not self._records:
+            return 0
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = insert_documents(conn, self._records)
+            if self.on_chunk:
+                self.on_chunk(conn, ids, self._tags)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self.chunk_counts.append(len(ids))
+        self._records, self._tags = [], []
+        return len(ids)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+# ────────────────────────── HELPERS ──────────────────────────
+def notes_preview(notes) -> str:
+    """First ``PREVIEW_CHARS`` characters of *notes* on a single line."""
+    text = " ".join((notes or "").split())
+    if len(text) <= PREVIEW_CHARS:
+        return text
+    return text[:PREVIEW_CHARS].rstrip() + ELLIPSIS
+
+def is_truncated(preview) -> bool:
+    return bool(preview) and preview.endswith(ELLIPSIS)
+
+def get_notes(conn: sqlite3.Connection, doc_id: int):
+    """Full notes of one document, or ``None`` if it does not exist."""
+    row = conn.execute(
+        "SELECT notes FROM documents WHERE id = ?", (doc_id,)
+    ).fetchone()
+    return None if row is None else (row[0] or "")
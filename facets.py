@@ -0,0 +1,99 @@
+"""
+facets.py
+-------------------------------------------------
+Precomputed values and counts for the ``/documents`` filter dropdowns.
+
+Instead of three ``SELECT DISTINCT`` scans over ``documents`` per page
+view, ``document_facets`` holds one row per (facet, value) with the
+number of documents carrying it. Triggers on ``documents`` keep the
+counts current for every writer (web app, ingest worker, external
+importers), so reading the dropdowns costs O(facets), not O(documents).
+"""
+
+import sqlite3
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+FACET_COLUMNS = ["category", "company_type", "company_name"]
+
+# ────────────────────────── SCHEMA ───────────────────────────
+def _add_sql(ref: str) -> str:
+    return "\n".join(
+        f"""
+            INSERT INTO document_facets (facet, value, count)
+            SELECT '{col}', {ref}.{col}, 1 WHERE {ref}.{col} != ''
+            ON CONFLICT(facet, value) DO UPDATE SET count = count + 1;"""
+        for col in FACET_COLUMNS
+    )
+
+def _remove_sql(ref: str) -> str:
+    return "\n".join(
+        f"""
+            UPDATE document_facets SET count = count - 1
+            WHERE facet = '{col}' AND value = {ref}.{col};"""
+        for col in FACET_COLUMNS
+    ) + "\n            DELETE FROM document_facets WHERE count <= 0;"
+
+def init_facets(conn: sqlite3.Connection) -> None:
+    """Create the facet table and its triggers; count existing rows once."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='document_facets'"
+    ).fetchone()
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS document_facets (
+            facet  TEXT NOT NULL,
+            value  TEXT NOT NULL,
+            count  INTEGER NOT NULL,
+            PRIMARY KEY (facet, value)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS document_facets_ai AFTER INSERT ON documents
+        BEGIN {_add_sql("new")}
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS document_facets_ad AFTER DELETE ON documents
+        BEGIN {_remove_sql("old")}
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS document_facets_au
+        AFTER UPDATE OF {", ".join(FACET_COLUMNS)} ON documents
+        BEGIN {_remove_sql("old")} {_add_sql("new")}
+        END
+        """
+    )
+
+    if not exists:
+        rebuild_facets(conn)
+
+def rebuild_facets(conn: sqlite3.Connection) -> None:
+    """Recount every facet from ``documents`` (one scan per facet)."""
+    conn.execute("DELETE FROM document_facets")
+    for col in FACET_COLUMNS:
+        conn.execute(
+            f"""
+            INSERT INTO document_facets (facet, value, count)
+            SELECT '{col}', {col}, COUNT(*) FROM documents
+            WHERE {col} IS NOT NULL AND {col} != ''
+            GROUP BY {col}
+            """
+        )
+
+# ────────────────────────── QUERIES ──────────────────────────
+def load_facets(conn: sqlite3.Connection) -> dict:
+    """``{facet: [(value, count), …]}`` sorted by value, for the dropdowns."""
+    result = {col: [] for col in FACET_COLUMNS}
+    for facet, value, count in conn.execute(
+        "SELECT facet, value, count FROM document_facets ORDER BY facet, value"
+    ):
+        result[facet].append((value, count))
+    return result
@@ -0,0 +1,105 @@
+"""
+file_serving.py
+-------------------------------------------------
+HTTP delivery of stored PDFs for ``/uploads/<filename>``.
+
+Blobs are identified by their SHA-256, which doubles as a strong ETag:
+a browser that already holds the file gets ``304 Not Modified``
+instead of the whole PDF again. URLs that carry the hash
+(``/uploads/<name>?v=<sha256>``, as the list page builds them) can
+never point at other bytes, so they are cached for a year as
+``immutable``; bare names are revalidated on every use (a name is freed
+when its last document is deleted and may be reused later).
+
+Byte ranges (``Range`` / ``If-Range``) are answered with ``206`` so
+pdf.js can fetch the pages it shows instead of the entire scan.
+
+Optionally the transfer itself is handed to the front server, so a
+gunicorn worker is not tied up streaming 200 MB:
+
+    FILE_OFFLOAD=x-accel   nginx; needs an internal location, e.g.
+                               location /_uploads/ {
+                                   internal;
+                                   alias /app/uploads/;
+                               }
+    FILE_OFFLOAD=x-sendfile  Apache mod_xsendfile / lighttpd
+    FILE_ACCEL_PREFIX        internal location prefix, default /_uploads/
+
+The front server then handles ranges itself; conditional requests are
+still answered here, before any offload.
+"""
+
+from flask import request, send_file, send_from_directory, Response
+from pathlib import Path
+from urllib.parse import quote
+import os
+import unicodedata
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+FILE_OFFLOAD      = os.environ.get("FILE_OFFLOAD", "").lower()
+ACCEL_PREFIX      = os.environ.get("FILE_ACCEL_PREFIX", "/_uploads/")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+PDF_MIMETYPE      = "application/pdf"
+
+# ────────────────────────── HELPERS ──────────────────────────
+def _cache_headers(response: Response, versioned: bool) -> Response:
+    cc = response.cache_control
+    if versioned:
+        cc.no_cache = None      # send_file's default when no max_age is given
+        cc.public = True
+        cc.max_age = IMMUTABLE_MAX_AGE
+        cc.immutable = True
+    else:
+        cc.no_cache = True      # store, but revalidate (cheap 304) every time
+    return response
+
+def _disposition_names(download_name: str) -> dict:
+    """``filename`` parameters as ``send_file`` writes them (RFC 6266)."""
+    try:
+        download_name.encode("ascii")
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", download_name)
+        simple = simple.encode("ascii", "ignore").decode("ascii")
+        quoted = quote(download_name, safe="!#$&+-.^_`|~")    # RFC 5987 attr-char
+        return {"filename": simple, "filename*": f"UTF-8''{quoted}"}
+    return {"filename": download_name}
+
+def _accel_response(path: Path, root, etag: str, download_name: str) -> Response:
+    rel = path.resolve().relative_to(Path(root).resolve()).as_posix()
+    response = Response(status=200, mimetype=PDF_MIMETYPE)
+    response.headers["X-Accel-Redirect"] = ACCEL_PREFIX + rel
+    # headers.set quotes and escapes the parameters (a '"' in the name)
+    response.headers.set("Content-Disposition", "inline",
+                         **_disposition_names(download_name))
+    response.set_etag(etag)
+    return response
+
+# ─────────────────────────── SERVING ─────────────────────────
+def serve_blob(path: Path, root, content_hash: str, download_name: str) -> Response:
+    """Send a stored blob with a hash ETag, 304s, ranges and optional offload."""
+    versioned = request.args.get("v") == content_hash
+
+    if request.if_none_match.contains(content_hash):
+        response = Response(status=304)
+        response.set_etag(content_hash)
+        return _cache_headers(response, versioned)
+
+    if FILE_OFFLOAD == "x-accel":
+        response = _accel_response(path, root, content_hash, download_name)
+    else:
+        # send_file adds X-Sendfile itself when USE_X_SENDFILE is set
+        response = send_file(
+            path, mimetype=PDF_MIMETYPE, download_name=download_name,
+            etag=content_hash, conditional=True
+        )
+    response.headers["Accept-Ranges"] = "bytes"
+    return _cache_headers(response, versioned)
+
+def serve_legacy(root, filename: str) -> Response:
+    """Files stored flat before ``blob_store``: mtime/size ETag, always revalidated."""
+    response = send_from_directory(root, filename, conditional=True)
+    return _cache_headers(response, versioned=False)
+
+def configure(app) -> None:
+    """Apply ``FILE_OFFLOAD=x-sendfile`` to the Flask app."""
+    app.config["USE_X_SENDFILE"] = FILE_OFFLOAD == "x-sendfile"
@@ -0,0 +1,331 @@
+"""
+ingest_jobs.py
+-------------------------------------------------
+Persistent background ingestion for batch uploads.
+
+``/batch-upload`` only saves the files and records one row per file in
+``ingest_job_files``; a worker thread in every app process claims queued
+rows, OCRs them on the process pool and inserts the documents. Because
+the queue lives in SQLite, a restarted gunicorn worker picks up where
+the previous one stopped: claims carry a lease, and rows whose lease ran
+out (their worker died mid-file) are queued again.
+
+Progress is visible at ``/jobs/<id>`` (HTML) and ``/jobs/<id>/status``
+(JSON).
+
+When there is nothing to ingest and ``OCR_FULL_DOCUMENT=1``, the same
+thread OCRs the remaining pages of stored documents (``page_ocr``). It
+also keeps the preview images under their size cap (``thumb_cache``).
+
+Configuration (environment variables):
+    INGEST_WORKER          set to 0 to disable the worker thread
+    INGEST_LEASE_SECONDS   how long a claim is valid, default 900
+"""
+
+from flask import Blueprint, render_template, jsonify, abort
+from datetime import datetime
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from db import get_connection
+from ocr_engine import get_engine
+from ocr_store import column_exists
+from ocr_service import ocr_uploads
+from document_store import BulkInserter
+import page_ocr
+import thumb_cache
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+WORKER_ENABLED  = os.environ.get("INGEST_WORKER", "1") != "0"
+LEASE_SECONDS   = int(os.environ.get("INGEST_LEASE_SECONDS", "900"))
+POLL_SECONDS    = 2.0
+
+# ──────────────────────── BLUEPRINT SETUP ─────────────────────
+jobs_bp = Blueprint("jobs_bp", __name__, template_folder="templates")
+
+# ────────────────────────── SCHEMA ───────────────────────────
+def init_ingest_jobs(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at  TEXT NOT NULL,
+            total       INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ingest_job_files (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id         INTEGER NOT NULL REFERENCES ingest_jobs(id),
+            filename       TEXT NOT NULL,
+            path           TEXT NOT NULL,
+            status         TEXT NOT NULL DEFAULT 'queued',
+            error          TEXT,
+            doc_id         INTEGER,
+            claimed_by     TEXT,
+            lease_expires  REAL,
+            started_at     REAL,
+            finished_at    REAL,
+            content_hash   TEXT
+        )
+        """
+    )
+    # queues created before uploads were hashed while streaming
+    if not column_exists(conn, "ingest_job_files", "content_hash"):
+        conn.execute("ALTER TABLE ingest_job_files ADD COLUMN content_hash TEXT")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ingest_job_files_status "
+        "ON ingest_job_files(status, id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ingest_job_files_job "
+        "ON ingest_job_files(job_id)"
+    )
+
+# ─────────────────────────── QUEUE ───────────────────────────
+def enqueue_files(paths, hashes=None, filenames=None) -> int:
+    """
+    Create a job for files already saved under ``uploads/``; returns its
+    id. *hashes* are their SHA-256 digests when the upload computed them,
+    *filenames* the names the documents get (default: the file names).
+    """
+    hashes = hashes or [None] * len(paths)
+    filenames = filenames or [os.path.basename(p) for p in paths]
+    with get_connection() as conn:
+        cur = conn.execute(
+            "INSERT INTO ingest_jobs (created_at, total) VALUES (?, ?)",
+            (datetime.now().isoformat(timespec="seconds"), len(paths))
+        )
+        job_id = cur.lastrowid
+        conn.executemany(
+            """
+            INSERT INTO ingest_job_files (job_id, filename, path, content_hash)
+            VALUES (?, ?, ?, ?)
+            """,
+            [(job_id, name, str(p), h) for p, h, name in zip(paths, hashes, filenames)]
+        )
+    _wake.set()
+    return job_id
+
+def claim_files(worker_id: str, limit: int):
+    """
+    Atomically take up to *limit* queued files. Files left ``running``
+    by a worker whose lease expired are re-queued first.
+    """
+    now = time.time()
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            """
+            UPDATE ingest_job_files
+            SET status = 'queued', claimed_by = NULL, lease_expires = NULL
+            WHERE status = 'running' AND lease_expires < ?
+            """,
+            (now,)
+        )
+        rows = conn.execute(
+            """
+            SELECT id, path, content_hash, filename FROM ingest_job_files
+            WHERE status = 'queued' ORDER BY id LIMIT ?
+            """,
+            (limit,)
+        ).fetchall()
+        conn.executemany(
+            """
+            UPDATE ingest_job_files
+            SET status = 'running', claimed_by = ?, lease_expires = ?,
+                started_at = ?
+            WHERE id = ?
+            """,
+            [(worker_id, now + LEASE_SECONDS, now, r[0]) for r in rows]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return rows
+
+FINISH_SQL = """
+    UPDATE ingest_job_files
+    SET status = ?, doc_id = ?, error = ?, finished_at = ?,
+        lease_expires = NULL
+    WHERE id = ?
+"""
+
+def finish_file(file_id: int, doc_id=None, error=None) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            FINISH_SQL,
+            ("failed" if error else "done", doc_id, error, time.time(), file_id)
+        )
+
+def _mark_done(conn: sqlite3.Connection, doc_ids, tags) -> None:
+    # Runs inside the BulkInserter chunk transaction, next to the INSERT
+    now = time.time()
+    conn.executemany(
+        FINISH_SQL,
+        [("done", doc_id, ocr_error and f"OCR gagal: {ocr_error}", now, file_id)
+         for doc_id, (file_id, ocr_error) in zip(doc_ids, tags)]
+    )
+
+def process_claimed(rows) -> None:
+    """
+    OCR a claimed batch on the process pool, then insert the documents
+    and mark their files done in chunked transactions. A file whose OCR
+    failed still becomes a document (with empty notes); its row keeps
+    the OCR error so the job page can point at it.
+    """
+    results = ocr_uploads(
+        [path for _, path, _, _ in rows], hashes=[h for _, _, h, _ in rows]
+    )
+    bulk = BulkInserter(get_connection(), on_chunk=_mark_done)
+    try:
+        for (file_id, _, _, filename), (_, content_hash, notes, error) in zip(rows, results):
+            if error:
+                print("⚠️ OCR gagal:", filename, "→", error)
+            bulk.add(
+                {
+                    "filename":     filename,
+                    "notes":        notes.strip(),
+                    "content_hash": content_hash,
+                },
+                tag=(file_id, error)
+            )
+        bulk.flush()
+    except Exception as e:
+        # The failed chunk was rolled back; earlier chunks stay committed
+        print("❌ Batch error:", e)
+        for file_id, _ in bulk.pending_tags:
+            finish_file(file_id, error=str(e))
+
+# ────────────────────────── WORKER ───────────────────────────
+_wake = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+def _run_worker() -> None:
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        _evict_previews()
+        try:
+            rows = claim_files(worker_id, get_engine().max_workers)
+        except sqlite3.OperationalError as e:
+            print("⚠️ Ingest worker:", e)
+            rows = []
+        if rows:
+            try:
+                process_claimed(rows)
+            except Exception as e:
+                # e.g. a queued file vanished from uploads/ before OCR
+                print("❌ Ingest worker:", e)
+                for file_id, *_ in rows:
+                    finish_file(file_id, error=str(e))
+            continue
+        if page_ocr.FULL_DOCUMENT and _index_pages():
+            continue            # batch files are checked again between documents
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+
+def _evict_previews() -> None:
+    try:
+        thumb_cache.maybe_evict()
+    except OSError as e:
+        print("⚠️ Preview cache:", e)
+
+def _index_pages() -> bool:
+    """Idle time: full-document OCR of one document (see ``page_ocr``)."""
+    try:
+        return page_ocr.index_next() is not None
+    except Exception as e:
+        print("⚠️ Page OCR:", e)
+        return False
+
+def start_worker() -> None:
+    """Start this process's ingest thread (idempotent)."""
+    global _worker
+    if not WORKER_ENABLED:
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_run_worker, name="ingest-worker", daemon=True
+            )
+            _worker.start()
+
+# ────────────────────────── STATUS ───────────────────────────
+def job_status(job_id: int):
+    """Per-file states plus aggregate counts and throughput, or ``None``."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
+        job = cur.execute(
+            "SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if job is None:
+            return None
+        files = cur.execute(
+            """
+            SELECT filename, status, error, doc_id, started_at, finished_at
+            FROM ingest_job_files WHERE job_id = ? ORDER BY id
+            """,
+            (job_id,)
+        ).fetchall()
+
+    counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+    for f in files:
+        counts[f["status"]] += 1
+
+    finished = [f for f in files if f["finished_at"]]
+    throughput = None
+    if finished:
+        started = min(f["started_at"] for f in finished)
+        elapsed = max(f["finished_at"] for f in finished) - started
+        if elapsed > 0:
+            throughput = round(len(finished) / elapsed * 60, 1)
+
+    if counts["queued"] + counts["running"] == 0:
+        state = "failed" if counts["done"] == 0 and counts["failed"] else "done"
+    elif counts["queued"] == len(files):
+        state = "queued"
+    else:
+        state = "running"
+
+    return {
+        "id":                 job["id"],
+        "created_at":         job["created_at"],
+        "total":              job["total"],
+        "state":              state,
+        "counts":             counts,
+        "files_per_minute":   throughput,
+        "files": [
+            {
+                "filename": f["filename"],
+                "status":   f["status"],
+                "error":    f["error"],
+                "doc_id":   f["doc_id"],
+            }
+            for f in files
+        ],
+    }
+
+# ─────────────────────────── ROUTES ──────────────────────────
+@jobs_bp.route("/jobs/<int:job_id>")
+def show(job_id):
+    """Human-readable progress page; refreshes itself until the job ends."""
+    status = job_status(job_id)
+    if status is None:
+        abort(404)
+    return render_template("job_status.html", job=status)
+
+@jobs_bp.route("/jobs/<int:job_id>/status")
+def status_json(job_id):
+    status = job_status(job_id)
+    if status is None:
+        abort(404)
+    return jsonify(status)
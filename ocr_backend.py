@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+ocr_backend.py
+-------------------------------------------------
+Which Tesseract runs the OCR: a warm in-process engine, or pytesseract.
+
+``pytesseract.image_to_string`` writes every image to a temp file and
+starts a fresh ``tesseract`` process, which loads the traineddata
+(``ind``/``eng``) again; for a one-page scan that startup costs more
+than the recognition itself.
+
+The ``tessapi`` backend instead talks to libtesseract's C API (the
+library ``tesseract-ocr`` ships; loaded with ctypes, no extra Python
+package). The engine is initialised once per process and reused, so
+each ``OcrEngine`` pool worker and each gunicorn worker keeps its
+language data loaded for its whole life. Page images are handed over
+as raw pixels in memory; nothing is written to disk.
+
+``recognize`` takes a time limit: pytesseract kills its ``tesseract``
+process, and libtesseract is given a deadline through its progress
+monitor (``ETEXT_DESC``) and stops on its own. Either way the page
+fails with ``TimeoutError`` instead of blocking the worker.
+
+Configuration (environment variables):
+    OCR_BACKEND     auto (default): tessapi when libtesseract loads,
+                    else pytesseract; or force tessapi / pytesseract
+    OCR_LANG        Tesseract languages, default eng (Docker: ind+eng)
+    TESSERACT_LIB   path to libtesseract when it is not on the loader path
+    TESSDATA_PREFIX folder holding the traineddata files (Tesseract's own)
+
+To compare per-page latency of the two backends on real scans:
+
+Run: python ocr_backend.py bench FILE.pdf [FILE.pdf …] [--rounds 5]
+"""
+
+from ctypes import (
+    CDLL, POINTER, c_char_p, c_int, c_ubyte, c_void_p, string_at
+)
+from ctypes.util import find_library
+from typing import NamedTuple
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+import pytesseract
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+OCR_BACKEND   = os.environ.get("OCR_BACKEND", "auto").lower()
+OCR_LANG      = os.environ.get("OCR_LANG", "eng")
+TESSERACT_LIB = os.environ.get("TESSERACT_LIB") or None
+DEFAULT_DPI   = 200       # pdf2image's render default
+PSM_AUTO      = 3         # the tesseract CLI's page segmentation default
+
+# ────────────────────────── BACKENDS ─────────────────────────
+class Recognition(NamedTuple):
+    text: str
+    confidence: float       # mean word confidence, 0–100
+
+class PytesseractBackend:
+    """One ``tesseract`` process per image (the original behaviour)."""
+
+    name = "pytesseract"
+
+    def image_to_string(self, image, dpi: int = None) -> str:
+        config = f"--dpi {dpi}" if dpi else ""
+        return pytesseract.image_to_string(image, lang=OCR_LANG, config=config)
+
+    def raster_to_string(self, raster) -> str:
+        return self.image_to_string(raster.image(), raster.dpi)
+
+    def recognize(self, raster, timeout: float = None):
+        """
+        Text and mean word confidence from one ``image_to_data`` run
+        (a second ``image_to_string`` would OCR the page twice).
+        """
+        try:
+            data = pytesseract.image_to_data(
+                raster.image(), lang=OCR_LANG, config=f"--dpi {raster.dpi}",
+                output_type=pytesseract.Output.DICT, timeout=timeout or 0
+            )
+        except RuntimeError as e:
+            # TesseractError is a RuntimeError too; this is the kill at the timeout
+            if str(e) != "Tesseract process timeout":
+                raise
+            raise TimeoutError(f"tesseract timed out after {timeout:.0f}s") from None
+        lines, confidences = {}, []
+        for i, word in enumerate(data["text"]):
+            conf = float(data["conf"][i])
+            if conf < 0 or not word.strip():
+                continue
+            confidences.append(conf)
+            line = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(line, []).append(word)
+
+        text, previous = [], None
+        for (block, par, _), words in lines.items():
+            if previous is not None and previous != (block, par):
+                text.append("")             # blank line between paragraphs
+            text.append(" ".join(words))
+            previous = (block, par)
+        confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return Recognition("\n".join(text) + "\n", confidence)
+
+def _load_library() -> CDLL:
+    candidates = [name for name in (
+        TESSERACT_LIB, find_library("tesseract"),
+        "libtesseract.so.5", "libtesseract.so.4", "libtesseract-5.dll"
+    ) if name]
+    for name in candidates:
+        try:
+            lib = CDLL(name)
+        except OSError:
+            continue
+        lib.TessBaseAPICreate.restype = c_void_p
+        lib.TessBaseAPIInit3.argtypes = [c_void_p, c_char_p, c_char_p]
+        lib.TessBaseAPIInit3.restype = c_int
+        lib.TessBaseAPISetPageSegMode.argtypes = [c_void_p, c_int]
+        lib.TessBaseAPISetImage.argtypes = [
+            c_void_p, POINTER(c_ubyte), c_int, c_int, c_int, c_int
+        ]
+        lib.TessBaseAPISetSourceResolution.argtypes = [c_void_p, c_int]
+        lib.TessBaseAPIRecognize.argtypes = [c_void_p, c_void_p]
+        lib.TessBaseAPIRecognize.restype = c_int
+        lib.TessMonitorCreate.restype = c_void_p
+        lib.TessMonitorSetDeadlineMSecs.argtypes = [c_void_p, c_int]
+        lib.TessMonitorDelete.argtypes = [c_void_p]
+        lib.TessBaseAPIGetUTF8Text.argtypes = [c_void_p]
+        lib.TessBaseAPIGetUTF8Text.restype = c_void_p     # freed with TessDeleteText
+        lib.TessBaseAPIMeanTextConf.argtypes = [c_void_p]
+        lib.TessBaseAPIMeanTextConf.restype = c_int
+        lib.TessBaseAPIClear.argtypes = [c_void_p]
+        lib.TessBaseAPIEnd.argtypes = [c_void_p]
+        lib.TessBaseAPIDelete.argtypes = [c_void_p]
+        lib.TessDeleteText.argtypes = [c_void_p]
+        return lib
+    raise OSError(f"libtesseract not found (tried {', '.join(candidates)})")
+
+class TessApiBackend:
+    """
+    libtesseract kept initialised in this process. One engine per
+    process, serialised by a lock: the C API object is not thread-safe,
+    and a second copy of the language data per thread is not worth it.
+    """
+
+    name = "tessapi"
+
+    def __init__(self, lang: str = OCR_LANG):
+        self._lib = _load_library()
+        self._api = self._lib.TessBaseAPICreate()
+        datapath = os.environ.get("TESSDATA_PREFIX")
+        if self._lib.TessBaseAPIInit3(
+            self._api, datapath.encode() if datapath else None, lang.encode()
+        ) != 0:
+            self._lib.TessBaseAPIDelete(self._api)
+            raise OSError(f"Tesseract could not load language data '{lang}'")
+        self._lib.TessBaseAPISetPageSegMode(self._api, PSM_AUTO)
+        self._lock = threading.Lock()
+
+    def image_to_string(self, image, dpi: int = None) -> str:
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+        width, height = image.size
+        return self._recognize(
+            bytearray(image.tobytes()), width, height, 1 if image.mode == "L" else 3,
+            dpi or int(image.info.get("dpi", (DEFAULT_DPI,))[0])
+        ).text
+
+    def raster_to_string(self, raster) -> str:
+        return self.recognize(raster).text
+
+    def recognize(self, raster, timeout: float = None):
+        """OCR a ``raster.PageRaster`` in place, without copying its pixels."""
+        return self._recognize(raster.pixels, raster.width, raster.height,
+                               raster.channels, raster.dpi, timeout)
+
+    def _recognize(self, pixels: bytearray, width: int, height: int,
+                   channels: int, dpi: int, timeout: float = None):
+        buffer = (c_ubyte * len(pixels)).from_buffer(pixels)
+        lib, api = self._lib, self._api
+        with self._lock:
+            monitor = None
+            if timeout:
+                monitor = lib.TessMonitorCreate()
+                lib.TessMonitorSetDeadlineMSecs(monitor, max(1, int(timeout * 1000)))
+            try:
+                lib.TessBaseAPISetImage(api, buffer, width, height, channels,
+                                        width * channels)
+                lib.TessBaseAPISetSourceResolution(api, dpi)
+                if lib.TessBaseAPIRecognize(api, monitor) != 0:
+                    if monitor:
+                        raise TimeoutError(f"tesseract timed out after {timeout:.0f}s")
+                    raise RuntimeError("Tesseract returned no result")
+                raw = lib.TessBaseAPIGetUTF8Text(api)
+                if not raw:
+                    raise RuntimeError("Tesseract returned no result")
+                try:
+                    text = string_at(raw).decode("utf-8", errors="replace")
+                finally:
+                    lib.TessDeleteText(raw)
+                confidence = lib.TessBaseAPIMeanTextConf(api)
+            finally:
+                lib.TessBaseAPIClear(api)       # drop the image, keep the models
+                if monitor:
+                    lib.TessMonitorDelete(monitor)
+        return Recognition(text, float(confidence))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._api:
+                self._lib.TessBaseAPIEnd(self._api)
+                self._lib.TessBaseAPIDelete(self._api)
+                self._api = None
+
+BACKENDS = {"tessapi": TessApiBackend, "pytesseract": PytesseractBackend}
+
+# ─────────────────────── PER-PROCESS ENGINE ──────────────────
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """The configured backend, created on first use in each process."""
+    global _backend, _backend_pid
+    with _backend_lock:
+        # a forked child must not share the parent's engine
+        if _backend is None or _backend_pid != os.getpid():
+            _backend = _create(OCR_BACKEND)
+            _backend_pid = os.getpid()
+        return _backend
+
+def _create(choice: str):
+    if choice == "auto":
+        try:
+            return TessApiBackend()
+        except (OSError, AttributeError) as e:
+            print("⚠️ libtesseract tidak tersedia, memakai pytesseract:", e)
+            return PytesseractBackend()
+    if choice not in BACKENDS:
+        raise ValueError(f"OCR_BACKEND tidak dikenal: {choice}")
+    return BACKENDS[choice]()
+
+def image_to_string(image, dpi: int = None) -> str:
+    """OCR one page image with the process's warm backend."""
+    return get_backend().image_to_string(image, dpi)
+
+def raster_to_string(raster) -> str:
+    """OCR a rendered page (``raster.render_page``) with the warm backend."""
+    return get_backend().raster_to_string(raster)
+
+def recognize(raster, timeout: float = None) -> Recognition:
+    """
+    Text and confidence of a rendered page, with the warm backend;
+    raises ``TimeoutError`` when it takes longer than *timeout* seconds.
+    """
+    return get_backend().recognize(raster, timeout)
+
+# ────────────────────────── BENCHMARK ────────────────────────
+def bench(paths, rounds: int) -> None:
+    from pdf2image import convert_from_path
+    import raster
+
+    started = time.perf_counter()
+    for p in paths:
+        convert_from_path(p, first_page=1, last_page=1, poppler_path=raster.POPPLER_PATH)
+    legacy = (time.perf_counter() - started) / len(paths)
+    started = time.perf_counter()
+    pages = [raster.render_page(p) for p in paths]
+    piped = (time.perf_counter() - started) / len(paths)
+    per_page = statistics.mean(page.nbytes for page in pages)
+
+    print(f"⚙️  {len(pages)} page(s) × {rounds} rounds, lang={OCR_LANG}, "
+          f"{raster.OCR_DPI} DPI grayscale")
+    print(f"{'render':12} pdf2image {legacy * 1000:7.0f} ms   "
+          f"pipe {piped * 1000:7.0f} ms   {per_page / 1024 / 1024:.1f} MB/page")
+
+    for name, cls in BACKENDS.items():
+        started = time.perf_counter()
+        try:
+            backend = cls()
+        except OSError as e:
+            print(f"{name:12} unavailable: {e}")
+            continue
+        setup = time.perf_counter() - started
+
+        timings = []
+        for _ in range(rounds):
+            for page in pages:
+                started = time.perf_counter()
+                backend.raster_to_string(page)
+                timings.append(time.perf_counter() - started)
+        if hasattr(backend, "close"):
+            backend.close()
+        print(f"{name:12} init {setup * 1000:7.0f} ms   "
+              f"per page: first {timings[0] * 1000:7.0f} ms  "
+              f"median {statistics.median(timings) * 1000:7.0f} ms  "
+              f"mean {statistics.mean(timings) * 1000:7.0f} ms")
+
+def main(argv) -> None:
+    parser = argparse.ArgumentParser(description="Compare OCR backend latency.")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args(argv)
+    bench(args.pdfs, args.rounds)
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv[1:])
+    except Exception as exc:
+        print("❌ Something went wrong:", exc, file=sys.stderr)
+        sys.exit(1)
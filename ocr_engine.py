@@ -0,0 +1,211 @@
+"""
+ocr_engine.py
+-------------------------------------------------
+Bounded process pool for rendering and OCR-ing many PDFs at once.
+
+pdf2image and Tesseract are CPU bound and take seconds per file, so
+batch uploads fan the work out across cores instead of looping on the
+gunicorn worker thread.
+
+Each file is an independent task: an exception or a crashed child
+only fails that file (the pool is rebuilt and the other in-flight
+files are retried once), and results are yielded as soon as they
+complete so one slow PDF never holds back the rest.
+
+Extraction keeps to ``OCR_FILE_TIMEOUT`` inside the child (pdftoppm
+and Tesseract get the remaining time); a task still running
+``KILL_GRACE`` seconds after that is hung in native code, so its
+worker processes are killed and the pool rebuilt. The hung file is
+retried up to ``OCR_MAX_ATTEMPTS`` times in total; the other files that
+were in flight on the killed pool are resubmitted without losing an
+attempt.
+
+Timeouts are measured by the caller driving :meth:`OcrEngine.run`, so
+an engine runs one call at a time: a second thread waits for the pool
+instead of having its queueing time counted as run time (and its files
+killed with the first caller's hung one). Request threads therefore
+use :func:`interactive_engine`, a separate one-worker pool with a single
+attempt per file, and never wait behind the ingest thread's
+:func:`get_engine`; one file there ends within ``HARD_TIMEOUT``, well
+inside gunicorn's ``--timeout 180``.
+
+Configuration (environment variables):
+    OCR_WORKERS        number of OCR processes, default = CPU cores
+    OCR_FILE_TIMEOUT   seconds one file may take, default 120 (0 = no limit)
+    OCR_MAX_ATTEMPTS   tries per file after a crash or timeout, default 2
+"""
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+import os
+import threading
+import time
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+OCR_WORKERS      = int(os.environ.get("OCR_WORKERS", "0")) or os.cpu_count() or 1
+MAX_ATTEMPTS     = int(os.environ.get("OCR_MAX_ATTEMPTS", "2"))
+INFLIGHT_FACTOR  = 2      # queued tasks per worker, bounds parent memory
+FILE_TIMEOUT     = float(os.environ.get("OCR_FILE_TIMEOUT", "120"))
+KILL_GRACE       = 30     # past FILE_TIMEOUT before the worker is killed
+HARD_TIMEOUT     = FILE_TIMEOUT + KILL_GRACE if FILE_TIMEOUT > 0 else None
+POLL_SECONDS     = 1.0    # how often running tasks are checked against it
+
+# ────────────────────────── RESULTS ──────────────────────────
+class OcrOutcome(NamedTuple):
+    path: str
+    text: Optional[str]
+    error: Optional[str]
+    seconds: float
+
+def _timed_call(func: Callable[[str], str], path: str):
+    """Runs in the child process."""
+    started = time.perf_counter()
+    text = func(path)
+    return text, time.perf_counter() - started
+
+# ────────────────────────── ENGINE ───────────────────────────
+class OcrEngine:
+    """Process pool that runs a text extractor over many files."""
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 max_attempts: Optional[int] = None):
+        self.max_workers = max_workers or OCR_WORKERS
+        self.max_attempts = max_attempts or MAX_ATTEMPTS
+        self._pool = None
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()    # one run() at a time, see above
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def _discard(self, pool: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _kill(self, pool: ProcessPoolExecutor) -> None:
+        """Kill the pool's worker processes, e.g. one stuck inside Tesseract."""
+        kill_workers = getattr(pool, "kill_workers", None)     # Python 3.14+
+        if kill_workers is not None:
+            kill_workers()
+        else:
+            # no public way before 3.14; the executor notices the dead
+            # children and fails their futures with BrokenProcessPool
+            for proc in list((pool._processes or {}).values()):
+                proc.kill()
+        self._discard(pool)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def run(self, paths: Iterable, func: Callable[[str], str]) -> Iterator[OcrOutcome]:
+        """
+        Applies *func* (a picklable, module-level function) to every path
+        and yields an :class:`OcrOutcome` per path in completion order.
+        Tuples such as ``(path, page)`` are passed to *func* unchanged.
+        Closing the iterator early cancels the tasks not yet started.
+        Concurrent calls on one engine run one after the other.
+        """
+        queue = [(p if isinstance(p, tuple) else str(p), 1) for p in paths]
+        queue.reverse()
+        pending = {}
+        window = self.max_workers * INFLIGHT_FACTOR
+        with self._run_lock:
+            try:
+                yield from self._drive(queue, pending, window, func)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _drive(self, queue, pending, window, func):
+        started = {}            # future → when it began executing
+        while queue or pending:
+            while queue and len(pending) < window:
+                path, attempt = queue.pop()
+                pool = self._executor()
+                try:
+                    future = pool.submit(_timed_call, func, path)
+                except BrokenProcessPool:
+                    self._discard(pool)
+                    queue.append((path, attempt))
+                    continue
+                pending[future] = (path, attempt, pool)
+
+            done, _ = wait(pending, timeout=HARD_TIMEOUT and POLL_SECONDS,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                path, attempt, pool = pending.pop(future)
+                started.pop(future, None)
+                try:
+                    text, seconds = future.result()
+                except BrokenProcessPool as e:
+                    self._discard(pool)
+                    if attempt < self.max_attempts:
+                        queue.append((path, attempt + 1))
+                    else:
+                        yield OcrOutcome(path, None, f"worker crashed: {e}", 0.0)
+                except Exception as e:
+                    yield OcrOutcome(path, None, str(e), 0.0)
+                else:
+                    yield OcrOutcome(path, text, None, seconds)
+            if HARD_TIMEOUT:
+                yield from self._expire(queue, pending, started)
+
+    def _expire(self, queue, pending, started):
+        """Kill the pool when a task has run past ``HARD_TIMEOUT``."""
+        now = time.monotonic()
+        # Futures count as running from the moment they are handed to the
+        # pool's call queue, one more than there are workers; in submission
+        # order, only the first max_workers of them are really executing.
+        executing = [f for f in pending if f.running()][:self.max_workers]
+        for future in list(started):
+            if future not in executing:
+                del started[future]
+        for future in executing:
+            started.setdefault(future, now)
+        overdue = {f for f in executing if now - started[f] > HARD_TIMEOUT}
+        if not overdue:
+            return
+
+        pool = pending[next(iter(overdue))][2]
+        self._kill(pool)
+        for future in [f for f, task in pending.items() if task[2] is pool]:
+            path, attempt, _ = pending.pop(future)
+            started.pop(future, None)
+            if future not in overdue:
+                queue.append((path, attempt))       # innocent bystander
+            elif attempt < self.max_attempts:
+                queue.append((path, attempt + 1))
+            else:
+                yield OcrOutcome(path, None, f"timed out after {HARD_TIMEOUT:.0f}s",
+                                 HARD_TIMEOUT)
+
+# One of each per gunicorn worker; the pools themselves are created on
+# first use, i.e. after gunicorn has forked, never in the master process.
+_engine = None
+_interactive = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> OcrEngine:
+    """The background engine: ingest thread, full-document OCR."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = OcrEngine()
+        return _engine
+
+def interactive_engine() -> OcrEngine:
+    """The engine for OCR inside a request: one worker, one attempt."""
+    global _interactive
+    with _engine_lock:
+        if _interactive is None:
+            _interactive = OcrEngine(max_workers=1, max_attempts=1)
+        return _interactive
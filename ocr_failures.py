@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+ocr_failures.py
+-------------------------------------------------
+Structured record of PDFs whose OCR failed, and their quarantine.
+
+A failed extraction (corrupt PDF, render or Tesseract timeout, crashed
+worker) used to end up as ``[Gagal ekstraksi: …]`` text in
+``documents.notes``. Failures are now recorded per file content in
+``ocr_failures`` instead, with the error, the number of attempts and
+when they happened; the document keeps empty notes and the pages show
+the error next to it.
+
+Content that has failed ``OCR_QUARANTINE_AFTER`` times (default 3) is
+quarantined: later uploads, batch jobs and bulk imports of the same
+file skip OCR immediately instead of spending another timeout of pool
+time on it. A successful OCR clears the record. The edit page never
+retries a failed file by itself; its "Coba OCR lagi" button (or
+``release`` below) does.
+
+Run: python ocr_failures.py list
+     python ocr_failures.py release SHA256     (try OCR again next time)
+"""
+
+from datetime import datetime
+import argparse
+import os
+import sqlite3
+import sys
+
+from db import get_connection
+from ocr_store import EXTRACTION_ERROR
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+QUARANTINE_AFTER = int(os.environ.get("OCR_QUARANTINE_AFTER", "3"))
+ERROR_CHARS      = 500
+
+# ────────────────────────── SCHEMA ───────────────────────────
+def init_ocr_failures(conn: sqlite3.Connection) -> None:
+    """Create the failure table; move old error text out of ``notes`` once."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='ocr_failures'"
+    ).fetchone()
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ocr_failures (
+            content_hash     TEXT PRIMARY KEY,
+            attempts         INTEGER NOT NULL,
+            last_error       TEXT NOT NULL,
+            quarantined      INTEGER NOT NULL DEFAULT 0,
+            first_failed_at  TEXT NOT NULL,
+            last_failed_at   TEXT NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    if not exists:
+        migrate_error_notes(conn)
+
+def migrate_error_notes(conn: sqlite3.Connection) -> int:
+    """Documents whose notes hold an extraction error get a failure record instead."""
+    rows = conn.execute(
+        "SELECT id, content_hash, notes FROM documents WHERE ltrim(notes) LIKE ?",
+        (EXTRACTION_ERROR + "%",)
+    ).fetchall()
+    for doc_id, content_hash, notes in rows:
+        if content_hash:
+            record_failure(conn, content_hash, notes.strip().strip("[]"))
+        conn.execute(
+            "UPDATE documents SET notes = '', notes_preview = '' WHERE id = ?", (doc_id,)
+        )
+    return len(rows)
+
+# ────────────────────────── RECORDS ──────────────────────────
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+def record_failure(conn: sqlite3.Connection, content_hash: str, error: str) -> bool:
+    """Count one failed attempt; returns whether the content is now quarantined."""
+    now = _now()
+    conn.execute(
+        """
+        INSERT INTO ocr_failures (content_hash, attempts, last_error, quarantined,
+                                  first_failed_at, last_failed_at)
+        VALUES (?, 1, ?, ? <= 1, ?, ?)
+        ON CONFLICT(content_hash) DO UPDATE SET
+            attempts = attempts + 1,
+            last_error = excluded.last_error,
+            quarantined = attempts + 1 >= ?,
+            last_failed_at = excluded.last_failed_at
+        """,
+        (content_hash, str(error)[:ERROR_CHARS], QUARANTINE_AFTER, now, now,
+         QUARANTINE_AFTER)
+    )
+    return is_quarantined(conn, content_hash)
+
+def clear_failure(conn: sqlite3.Connection, content_hash: str) -> None:
+    conn.execute("DELETE FROM ocr_failures WHERE content_hash = ?", (content_hash,))
+
+def is_quarantined(conn: sqlite3.Connection, content_hash: str) -> bool:
+    row = conn.execute(
+        "SELECT quarantined FROM ocr_failures WHERE content_hash = ?", (content_hash,)
+    ).fetchone()
+    return bool(row and row[0])
+
+def failure_for(conn: sqlite3.Connection, content_hash: str):
+    """``{"error", "attempts", "quarantined", "last_failed_at"}`` or ``None``."""
+    if not content_hash:
+        return None
+    row = conn.execute(
+        """
+        SELECT last_error, attempts, quarantined, last_failed_at
+        FROM ocr_failures WHERE content_hash = ?
+        """,
+        (content_hash,)
+    ).fetchone()
+    if row is None:
+        return None
+    error, attempts, quarantined, last_failed_at = row
+    return {"error": error, "attempts": attempts,
+            "quarantined": bool(quarantined), "last_failed_at": last_failed_at}
+
+def failure_counts(conn: sqlite3.Connection) -> dict:
+    failed, quarantined = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(quarantined), 0) FROM ocr_failures"
+    ).fetchone()
+    return {"failed_files": failed, "quarantined_files": quarantined}
+
+def quarantine_error(failure: dict) -> str:
+    return f"dikarantina setelah {failure['attempts']} kali gagal: {failure['error']}"
+
+# ──────────────────────────── CLI ────────────────────────────
+def main(argv) -> None:
+    parser = argparse.ArgumentParser(description="Inspect or release quarantined PDFs.")
+    parser.add_argument("command", choices=["list", "release"])
+    parser.add_argument("content_hash", nargs="?")
+    args = parser.parse_args(argv)
+
+    with get_connection() as conn:
+        init_ocr_failures(conn)
+        if args.command == "release":
+            if not args.content_hash:
+                parser.error("release needs a SHA-256")
+            clear_failure(conn, args.content_hash)
+            print(f"✅ {args.content_hash} released; it is OCR'd again on next use.")
+            return
+        rows = conn.execute(
+            """
+            SELECT f.content_hash, f.attempts, f.quarantined, f.last_failed_at,
+                   f.last_error, GROUP_CONCAT(d.filename, ', ')
+            FROM ocr_failures f
+            LEFT JOIN documents d ON d.content_hash = f.content_hash
+            GROUP BY f.content_hash ORDER BY f.last_failed_at DESC
+            """
+        ).fetchall()
+    for content_hash, attempts, quarantined, when, error, names in rows:
+        flag = "⛔" if quarantined else "⚠️ "
+        print(f"{flag} {content_hash[:12]}  {attempts}×  {when}  {names or '-'}\n    {error}")
+    print(f"{len(rows)} failed, {sum(1 for r in rows if r[2])} quarantined")
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv[1:])
+    except Exception as exc:
+        print("❌ Something went wrong:", exc, file=sys.stderr)
+        sys.exit(1)
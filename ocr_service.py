@@ -0,0 +1,365 @@
+"""
+ocr_service.py
+-------------------------------------------------
+The one place where the Arsip app turns a PDF into text.
+
+Single upload (``/upload``), batch upload (``/batch-upload``) and the
+edit page all go through this module, so a file is OCR'd at most once
+per distinct content: results are cached by SHA-256 in SQLite (see
+``ocr_store``) and re-uploads of an identical PDF under another name
+are served from the cache.
+
+Born-digital PDFs (NIB, NPWP, SK KumHam from the OSS portals) already
+carry a text layer; it is read with poppler's ``pdftotext`` and only
+when it is empty or looks like garbage is page 1 rasterized for
+Tesseract (``raster`` renders it in memory, grayscale; ``ocr_backend``
+runs a warm in-process engine, or pytesseract).
+Which path was taken is counted in ``ocr_cache_stats``. The page-1
+raster also feeds the thumbnails (see ``previews``).
+
+Each file gets ``OCR_FILE_TIMEOUT`` seconds for all of this, in a child
+process of ``ocr_engine`` that is killed if it hangs well past that; uploads
+handled inside a request use its one-worker interactive pool. A failed
+extraction comes back with empty text and its ``error`` set, and is
+recorded in ``ocr_failures``; content that keeps failing is quarantined
+and no longer sent to the pool.
+
+Configuration (environment variables):
+    OCR_CACHE_MAX_MB   size budget of the OCR cache, default 64
+    OCR_WORKERS        processes used for batch OCR, default = CPU cores
+    OCR_FILE_TIMEOUT   seconds per file before it fails, default 120
+    OCR_BACKEND        tessapi / pytesseract / auto (see ``ocr_backend``)
+    OCR_DPI            render resolution when OCR_ADAPTIVE=0, default 200
+    OCR_ADAPTIVE       1 (default): try OCR_DPI_STEPS (default 150,300)
+                       in order, stopping once the mean word confidence
+                       reaches OCR_MIN_CONFIDENCE (default 70) with
+                       enough words
+    POPPLER_PATH       folder holding the poppler binaries when they are
+                       not on PATH (e.g. poppler-24.08.0/Library/bin)
+"""
+
+from pathlib import Path
+from typing import NamedTuple, Optional
+import os
+import shutil
+import sqlite3
+import subprocess
+import time
+
+from db import get_connection
+import previews
+import ocr_backend
+import raster
+import ocr_failures
+from ocr_engine import FILE_TIMEOUT, OcrEngine, get_engine, interactive_engine
+from ocr_store import (
+    file_sha256, save_ocr_result, lookup_ocr_result, get_document_ocr,
+    attach_document, evict_ocr_cache, bump_stat, cache_stats
+)
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_MB", "64")) * 1024 * 1024
+POPPLER_PATH        = os.environ.get("POPPLER_PATH") or None
+PDFTOTEXT           = shutil.which("pdftotext", path=POPPLER_PATH)
+PDFTOTEXT_TIMEOUT   = 30     # seconds
+
+# Adaptive OCR: render at the first DPI, re-render at the next only when
+# Tesseract is unsure or finds too few words
+OCR_ADAPTIVE        = os.environ.get("OCR_ADAPTIVE", "1") != "0"
+OCR_DPI_STEPS       = [int(d) for d in os.environ.get("OCR_DPI_STEPS", "150,300").split(",")]
+MIN_OCR_CONFIDENCE  = float(os.environ.get("OCR_MIN_CONFIDENCE", "70"))
+MIN_OCR_WORDS       = 15
+
+# Text-layer quality thresholds
+MIN_LAYER_CHARS     = 40     # fewer visible characters → treat as empty
+MIN_LAYER_WORDS     = 8
+MIN_WORD_RATIO      = 0.6    # share of visible chars inside real words
+MAX_REPLACEMENT_RATIO = 0.01 # U+FFFD from undecodable glyphs
+
+# ────────────────────────── EXTRACTION ───────────────────────
+class Extraction(NamedTuple):
+    text: str
+    method: str                         # text_layer / tesseract / failed
+    confidence: Optional[float] = None  # Tesseract mean word confidence
+    dpi: Optional[int] = None           # render the text came from
+    error: Optional[str] = None         # why a "failed" extraction failed
+
+def read_text_layer(path, page: int = 1) -> str:
+    """
+    Returns the embedded text of one page via ``pdftotext``, or ``""``
+    when the tool is missing or the PDF has no usable text layer.
+    """
+    if PDFTOTEXT is None:
+        return ""
+    try:
+        proc = subprocess.run(
+            [PDFTOTEXT, "-f", str(page), "-l", str(page), "-layout", "-enc", "UTF-8",
+             str(path), "-"],
+            capture_output=True, timeout=PDFTOTEXT_TIMEOUT
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    if proc.returncode != 0:
+        return ""
+    return proc.stdout.decode("utf-8", errors="replace")
+
+def text_layer_usable(text: str) -> bool:
+    """
+    Heuristic for "this text layer is real text": enough visible
+    characters, enough words, and most characters belong to words of
+    letters/digits rather than symbol soup from broken font encodings.
+    """
+    visible = [c for c in text if not c.isspace()]
+    if len(visible) < MIN_LAYER_CHARS:
+        return False
+    if text.count("\ufffd") > len(visible) * MAX_REPLACEMENT_RATIO:
+        return False
+    words = [w for w in text.split() if sum(c.isalnum() for c in w) >= 2]
+    if len(words) < MIN_LAYER_WORDS:
+        return False
+    in_words = sum(sum(c.isalnum() for c in w) for w in words)
+    return in_words / len(visible) >= MIN_WORD_RATIO
+
+def _record_method(method: str, pages=(), escalated: bool = False,
+                   stats: Optional[str] = "") -> None:
+    # Runs in the OCR child process for batch uploads; stats are best-effort.
+    # *stats* prefixes the counter names; None records nothing.
+    if stats is None:
+        return
+    try:
+        with get_connection() as conn:
+            bump_stat(conn, stats + method)
+            for page in pages:
+                bump_stat(conn, stats + "raster_pages")
+                bump_stat(conn, stats + "raster_bytes", page.nbytes)
+            if escalated:
+                bump_stat(conn, stats + "dpi_escalations")
+    except sqlite3.Error:
+        pass
+
+def _word_count(text: str) -> int:
+    return sum(1 for w in text.split() if sum(c.isalnum() for c in w) >= 2)
+
+def _remaining(deadline) -> Optional[float]:
+    """Seconds left until *deadline* (``time.monotonic()``); ``None`` = no limit."""
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError(f"OCR took longer than {FILE_TIMEOUT:.0f}s")
+    return left
+
+def ocr_page(path, page_no: int = 1, deadline: float = None, stats: Optional[str] = ""):
+    """
+    Tesseract on one page, cheapest render first: each DPI in
+    ``OCR_DPI_STEPS`` is tried in turn until the confidence and word
+    yield are good enough. Returns ``(Recognition, dpi, page)`` of the
+    best attempt (``page`` is its raster, for the thumbnails). Rendering
+    and OCR stop at *deadline*; a finer render is then skipped when an
+    earlier one already produced text.
+    """
+    steps = OCR_DPI_STEPS if OCR_ADAPTIVE else [raster.OCR_DPI]
+    best, rendered = None, []
+    for dpi in steps:
+        try:
+            page = raster.render_page(path, page_no, dpi=dpi,
+                                      timeout=_remaining(deadline) or raster.RENDER_TIMEOUT)
+            result = ocr_backend.recognize(page, _remaining(deadline))
+        except TimeoutError:
+            if best is None:
+                raise
+            break
+        rendered.append(page)
+        if best is None or result.confidence > best[0].confidence:
+            best = (result, dpi, page)
+        if (result.confidence >= MIN_OCR_CONFIDENCE
+                and _word_count(result.text) >= MIN_OCR_WORDS):
+            break
+    _record_method("tesseract", rendered, escalated=len(rendered) > 1, stats=stats)
+    return best
+
+def extract(path, page_no: int = 1, stats: Optional[str] = "") -> Extraction:
+    """
+    Text of one page of a PDF (the first by default): the embedded text
+    layer when it is usable, otherwise Tesseract OCR of the rendered
+    page, all within ``OCR_FILE_TIMEOUT``. Failures come back with
+    method ``failed``, empty text and the reason in ``error``. Blobs
+    (``<sha256>.pdf``) get their thumbnails from the page-1 raster.
+    *stats* prefixes the ``ocr_cache_stats`` counters this bumps;
+    ``None`` leaves the database alone.
+    """
+    deadline = time.monotonic() + FILE_TIMEOUT if FILE_TIMEOUT > 0 else None
+    key = previews.key_for(path) if page_no == 1 else None
+    text = read_text_layer(path, page_no)
+    if text_layer_usable(text):
+        _record_method("text_layer", stats=stats)
+        if key and not previews.has_previews(key):
+            render_previews(path, key)
+        return Extraction(text, "text_layer")
+
+    try:
+        result, dpi, page = ocr_page(path, page_no, deadline, stats)
+    except Exception as e:
+        return Extraction("", "failed", error=str(e) or type(e).__name__)
+    if key:
+        previews.save_previews(page.image(), key)
+    return Extraction(result.text, "tesseract", round(result.confidence, 1), dpi)
+
+def extract_text_from_pdf(path) -> str:
+    """Just the text of :func:`extract`."""
+    return extract(path).text
+
+def render_previews(path, key: str) -> bool:
+    """
+    Render page 1 at a low DPI just for the thumbnails: for text-layer
+    PDFs (never rasterized for OCR) and for on-demand thumbnails.
+    Returns whether the images were written.
+    """
+    try:
+        page = raster.render_page(path, 1, dpi=previews.RENDER_DPI, gray=False)
+    except Exception as e:
+        print("⚠️ Preview gagal:", key, "→", e)
+        return False
+    return previews.save_previews(page.image(), key)
+
+# ─────────────────────────── CACHE ───────────────────────────
+def _lookup(conn: sqlite3.Connection, content_hash: str):
+    text = lookup_ocr_result(conn, content_hash)
+    bump_stat(conn, "hits" if text is not None else "misses")
+    return text
+
+def _cache_store_many(items) -> None:
+    """
+    Keep each ``(content_hash, extraction)`` result, or count its
+    failure against the content; one transaction for all of them.
+    """
+    if not items:
+        return
+    with get_connection() as conn:
+        for content_hash, extraction in items:
+            if extraction.error:
+                ocr_failures.record_failure(conn, content_hash, extraction.error)
+                continue
+            save_ocr_result(conn, content_hash, extraction.text, extraction.method,
+                            extraction.confidence, extraction.dpi)
+            ocr_failures.clear_failure(conn, content_hash)
+        evicted = evict_ocr_cache(conn, OCR_CACHE_MAX_BYTES)
+        if evicted:
+            bump_stat(conn, "evictions", evicted)
+
+def _quarantined(conn: sqlite3.Connection, content_hash: str):
+    """The quarantine error for *content_hash*, or ``None`` when it may be OCR'd."""
+    failure = ocr_failures.failure_for(conn, content_hash)
+    if failure and failure["quarantined"]:
+        return ocr_failures.quarantine_error(failure)
+    return None
+
+def extract_text_cached(path, content_hash: str = None):
+    """
+    Returns ``(content_hash, text)`` for the PDF at *path*, running OCR
+    only when this exact content has never been seen before.
+    The OCR runs in a child of :func:`interactive_engine`, so a hung
+    Tesseract is killed after the hard timeout instead of holding the
+    request thread. No database lock is held meanwhile. Pass
+    *content_hash* when it is already known (streamed uploads) to skip
+    re-reading the file. A failed or quarantined file gives ``""``; the
+    reason is in ``ocr_failures.failure_for``.
+    """
+    content_hash = content_hash or file_sha256(path)
+    [(_, _, text, _)] = ocr_uploads([path], interactive_engine(), [content_hash])
+    return content_hash, text
+
+def ocr_upload(path: Path, content_hash: str = None):
+    """
+    OCR a file that was just stored in ``uploads/``. Returns
+    ``(content_hash, text)``; a re-upload of known content is served
+    from the cache without rendering anything.
+    """
+    return extract_text_cached(path, content_hash)
+
+def stored_text(content_hash: str) -> str:
+    """
+    The text OCR'd earlier for *content_hash*, ``""`` when there is none
+    (it failed, or never ran). Never runs OCR: for pages shown after the
+    upload request already did.
+    """
+    with get_connection() as conn:
+        text = lookup_ocr_result(conn, content_hash)
+    return text or ""
+
+def ocr_uploads(paths, engine: OcrEngine = None, hashes=None):
+    """
+    Batch version of :func:`ocr_upload`. Cache misses are rendered and
+    OCR'd in parallel on the process pool; identical files inside one
+    batch are OCR'd once, and quarantined files not at all. Returns
+    ``(path, content_hash, text, error)`` tuples in input order; when
+    *error* is set (extraction failed, timed out, crashed its worker or
+    is quarantined) *text* is ``""``.
+    *hashes* may carry already computed SHA-256 digests, one per path
+    (``None`` where unknown). The cache is read in one transaction
+    before the pool runs and written in one after it.
+    """
+    engine = engine or get_engine()
+    results, misses = {}, {}
+
+    keyed = [(path, (hashes and hashes[i]) or file_sha256(path))
+             for i, path in enumerate(paths)]
+    with get_connection() as conn:
+        for path, content_hash in keyed:
+            text = _lookup(conn, content_hash)
+            quarantined = text is None and _quarantined(conn, content_hash)
+            if text is not None or quarantined:
+                results[path] = (content_hash, text or "", quarantined or None)
+            else:
+                misses.setdefault(content_hash, []).append(path)
+
+    first_paths = {str(group[0]): h for h, group in misses.items()}
+    stored = []
+    for outcome in engine.run(first_paths, extract):
+        content_hash = first_paths[outcome.path]
+        extraction = outcome.text or Extraction("", "failed", error=outcome.error)
+        stored.append((content_hash, extraction))
+        for path in misses[content_hash]:
+            results[path] = (content_hash, extraction.text, extraction.error)
+    _cache_store_many(stored)
+
+    return [(path, *results[path]) for path in paths]
+
+def document_text(conn: sqlite3.Connection, doc_id: int, path) -> str:
+    """
+    OCR text for the edit page. Documents that predate the OCR store are
+    resolved through the cache once and linked to their content. Content
+    whose OCR failed gives ``""`` without another attempt (the page shows
+    the failure); it is retried by :func:`retry_document` only.
+    """
+    text = get_document_ocr(conn, doc_id)
+    if text is not None:
+        return text
+    if not os.path.exists(path):
+        return ""
+
+    row = conn.execute("SELECT content_hash FROM documents WHERE id = ?", (doc_id,)).fetchone()
+    content_hash = (row and row[0]) or file_sha256(path)
+    attach_document(conn, doc_id, content_hash)
+    if ocr_failures.failure_for(conn, content_hash):
+        return ""
+    return extract_text_cached(path, content_hash)[1]
+
+def retry_document(content_hash: str, path) -> str:
+    """
+    Explicit "try again" from the edit page: forget the failure (and any
+    quarantine) and OCR the file once more on the interactive pool, a
+    single attempt under the hard timeout, so the request ends before
+    gunicorn's. Returns the text, ``""`` when it failed again.
+    """
+    with get_connection() as conn:
+        ocr_failures.clear_failure(conn, content_hash)
+    return extract_text_cached(path, content_hash)[1]
+
+def stats() -> dict:
+    """Hit/miss/eviction counters, current cache size and failures."""
+    with get_connection() as conn:
+        result = cache_stats(conn)
+        result.update(ocr_failures.failure_counts(conn))
+    result["max_bytes"] = OCR_CACHE_MAX_BYTES
+    return result
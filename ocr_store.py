@@ -0,0 +1,219 @@
+"""
+ocr_store.py
+-------------------------------------------------
+Persistent OCR results for the Arsip document archive.
+
+OCR text is stored once per *file content* (SHA-256) in the
+``ocr_results`` table, and every row in ``documents`` points at
+the content it was created from via ``documents.content_hash``.
+Opening a document for editing is therefore a single join on two
+primary keys instead of a pdf2image + Tesseract pass.
+
+Rows that no document references act as a content-addressed cache
+for re-uploads; they are evicted least-recently-used first once the
+table grows past its size budget (see :func:`evict_ocr_cache`).
+"""
+
+from datetime import datetime
+import hashlib
+import sqlite3
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+HASH_CHUNK_SIZE   = 1024 * 1024            # 1 MiB read blocks
+EXTRACTION_ERROR  = "[Gagal ekstraksi"     # failures older extractors wrote as text
+
+# ────────────────────────── SCHEMA ───────────────────────────
+def column_exists(conn: sqlite3.Connection, table: str, col: str) -> bool:
+    cur = conn.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == col for row in cur.fetchall())
+
+def init_ocr_store(conn: sqlite3.Connection) -> None:
+    """Create the OCR tables and the ``documents.content_hash`` link."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ocr_results (
+            content_hash  TEXT PRIMARY KEY,
+            text          TEXT NOT NULL,
+            created_at    TEXT NOT NULL,
+            size_bytes    INTEGER NOT NULL DEFAULT 0,
+            last_used     TEXT
+        )
+        """
+    )
+    # ocr_results created before the cache existed lacks the LRU columns
+    if not column_exists(conn, "ocr_results", "size_bytes"):
+        conn.execute(
+            "ALTER TABLE ocr_results "
+            "ADD COLUMN size_bytes INTEGER NOT NULL DEFAULT 0"
+        )
+        conn.execute("UPDATE ocr_results SET size_bytes = length(CAST(text AS BLOB))")
+    if not column_exists(conn, "ocr_results", "last_used"):
+        conn.execute("ALTER TABLE ocr_results ADD COLUMN last_used TEXT")
+        conn.execute("UPDATE ocr_results SET last_used = created_at")
+    # how the text was obtained: text_layer / tesseract, with Tesseract's
+    # mean word confidence and the DPI of the render that was kept
+    for col, decl in (("method", "TEXT"), ("confidence", "REAL"), ("ocr_dpi", "INTEGER")):
+        if not column_exists(conn, "ocr_results", col):
+            conn.execute(f"ALTER TABLE ocr_results ADD COLUMN {col} {decl}")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ocr_results_last_used "
+        "ON ocr_results(last_used)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ocr_cache_stats (
+            name   TEXT PRIMARY KEY,
+            value  INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+
+    if not column_exists(conn, "documents", "content_hash"):
+        conn.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_documents_filename "
+        "ON documents(filename)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_documents_content_hash "
+        "ON documents(content_hash)"
+    )
+
+# ────────────────────────── HELPERS ──────────────────────────
+def _now() -> str:
+    return datetime.now().isoformat(timespec="microseconds")
+
+def file_sha256(path) -> str:
+    """Return the hex SHA-256 digest of the file at *path*."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(HASH_CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def is_extraction_error(text: str) -> bool:
+    """Failed extractions are shown to the user but never persisted."""
+    return text.lstrip().startswith(EXTRACTION_ERROR)
+
+def save_ocr_result(conn: sqlite3.Connection, content_hash: str, text: str,
+                    method: str = None, confidence: float = None,
+                    dpi: int = None) -> None:
+    """Store *text* as the OCR result for *content_hash* (last write wins)."""
+    if is_extraction_error(text):
+        return
+    now = _now()
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO ocr_results
+        (content_hash, text, created_at, size_bytes, last_used,
+         method, confidence, ocr_dpi)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (content_hash, text, now, len(text.encode("utf-8")), now,
+         method, confidence, dpi)
+    )
+
+def lookup_ocr_result(conn: sqlite3.Connection, content_hash: str):
+    """
+    Returns the cached OCR text for *content_hash* and marks it as
+    recently used, or ``None`` on a cache miss.
+    """
+    row = conn.execute(
+        "SELECT text FROM ocr_results WHERE content_hash = ?",
+        (content_hash,)
+    ).fetchone()
+    if row is None:
+        return None
+    conn.execute(
+        "UPDATE ocr_results SET last_used = ? WHERE content_hash = ?",
+        (_now(), content_hash)
+    )
+    return row[0]
+
+def get_document_ocr(conn: sqlite3.Connection, doc_id: int):
+    """
+    Returns the stored OCR text for a document, or ``None`` when the
+    document predates the store or its file has not been OCR'd yet.
+    """
+    row = conn.execute(
+        """
+        SELECT o.text
+        FROM documents d
+        JOIN ocr_results o ON o.content_hash = d.content_hash
+        WHERE d.id = ?
+        """,
+        (doc_id,)
+    ).fetchone()
+    return row[0] if row else None
+
+def attach_document(conn: sqlite3.Connection, doc_id: int, content_hash: str) -> None:
+    """Point an existing document at the content it was created from."""
+    conn.execute(
+        "UPDATE documents SET content_hash = ? WHERE id = ?",
+        (content_hash, doc_id)
+    )
+
+def evict_ocr_cache(conn: sqlite3.Connection, max_bytes: int) -> int:
+    """
+    Evict least-recently-used cache entries until the table fits in
+    *max_bytes*. Entries still referenced by a document are pinned,
+    because the edit page depends on them. Returns the number evicted.
+    """
+    total = conn.execute(
+        "SELECT COALESCE(SUM(size_bytes), 0) FROM ocr_results"
+    ).fetchone()[0]
+    if total <= max_bytes:
+        return 0
+
+    candidates = conn.execute(
+        """
+        SELECT content_hash, size_bytes FROM ocr_results o
+        WHERE NOT EXISTS (
+            SELECT 1 FROM documents d WHERE d.content_hash = o.content_hash
+        )
+        ORDER BY last_used ASC
+        """
+    ).fetchall()
+
+    evicted = []
+    for content_hash, size in candidates:
+        if total <= max_bytes:
+            break
+        evicted.append((content_hash,))
+        total -= size
+    conn.executemany("DELETE FROM ocr_results WHERE content_hash = ?", evicted)
+    return len(evicted)
+
+def bump_stat(conn: sqlite3.Connection, name: str, amount: int = 1) -> None:
+    conn.execute(
+        """
+        INSERT INTO ocr_cache_stats (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        """,
+        (name, amount)
+    )
+
+def cache_stats(conn: sqlite3.Connection) -> dict:
+    """Counters plus current size of the OCR cache."""
+    stats = dict(conn.execute("SELECT name, value FROM ocr_cache_stats"))
+    pages = stats.get("raster_pages", 0)
+    entries, size, confidence = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0), AVG(confidence) FROM ocr_results"
+    ).fetchone()
+    return {
+        "hits":       stats.get("hits", 0),
+        "misses":     stats.get("misses", 0),
+        "evictions":  stats.get("evictions", 0),
+        "text_layer": stats.get("text_layer", 0),   # extraction paths taken
+        "tesseract":  stats.get("tesseract", 0),
+        "raster_pages": pages,                      # pages rendered for OCR
+        "raster_bytes_per_page": stats.get("raster_bytes", 0) // pages if pages else 0,
+        "dpi_escalations": stats.get("dpi_escalations", 0),   # low-DPI pass not enough
+        "page_text_layer": stats.get("page_text_layer", 0),   # full-document OCR, pages 2+
+        "page_tesseract":  stats.get("page_tesseract", 0),
+        "page_raster_pages": stats.get("page_raster_pages", 0),
+        "page_dpi_escalations": stats.get("page_dpi_escalations", 0),
+        "avg_confidence": round(confidence, 1) if confidence is not None else None,
+        "entries":    entries,
+        "bytes":      size,
+    }
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+page_ocr.py
+-------------------------------------------------
+Optional full-document OCR: every page, not only page 1.
+
+Uploads are OCR'd on page 1 only, which is enough to classify them but
+leaves the rest of an Akta or contract unsearchable. With
+``OCR_FULL_DOCUMENT=1`` the ingest worker of each app process, whenever
+it has no batch files waiting, takes the newest document whose pages
+have not been read yet and OCRs them on the shared process pool, one
+task per page, so a long scan uses every core.
+
+Pages are stored in ``ocr_pages`` (per content hash, like
+``ocr_results``) in page order as they finish, and indexed in
+``ocr_pages_fts``. ``/search/pages?q=…`` lists the matching pages with
+their page number and links straight to that page of the PDF.
+
+A document stops after ``OCR_MAX_PAGES`` pages or ``OCR_DOCUMENT_BUDGET``
+seconds, whichever comes first, and is marked ``truncated``, so one
+300-page scan can't keep the pool from new uploads. Legacy uploads not
+yet moved into the blob store are read from their flat file; a document
+whose PDF is gone is marked ``missing``. Page OCR is counted separately
+from page 1 in ``ocr_cache_stats`` (``page_tesseract`` etc.).
+
+Configuration (environment variables):
+    OCR_FULL_DOCUMENT     1 to enable the background page OCR, default 0
+    OCR_MAX_PAGES         page cap per document, default 50
+    OCR_DOCUMENT_BUDGET   seconds per document, default 300
+
+To OCR the existing archive from the command line instead:
+
+Run: python page_ocr.py run [--limit N]
+"""
+
+from flask import Blueprint, render_template, request
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import search_index
+from blob_store import blob_path, local_path
+from db import get_connection
+from ocr_engine import OcrEngine, get_engine
+from ocr_service import Extraction, extract
+from raster import page_count
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+UPLOAD_FOLDER   = "uploads"
+FULL_DOCUMENT   = os.environ.get("OCR_FULL_DOCUMENT", "0") == "1"
+MAX_PAGES       = int(os.environ.get("OCR_MAX_PAGES", "50"))
+DOCUMENT_BUDGET = float(os.environ.get("OCR_DOCUMENT_BUDGET", "300"))
+STALE_RUN       = DOCUMENT_BUDGET * 2    # a 'running' claim older than this was abandoned
+SEARCH_LIMIT    = 100
+
+# ──────────────────────── BLUEPRINT SETUP ─────────────────────
+page_ocr_bp = Blueprint("page_ocr_bp", __name__)
+
+# ────────────────────────── SCHEMA ───────────────────────────
+def init_page_store(conn: sqlite3.Connection) -> None:
+    """Create the per-page text table, its search index and the run log."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ocr_pages (
+            id            INTEGER PRIMARY KEY,
+            content_hash  TEXT NOT NULL,
+            page          INTEGER NOT NULL,
+            text          TEXT NOT NULL,
+            method        TEXT,
+            confidence    REAL,
+            ocr_dpi       INTEGER,
+            UNIQUE (content_hash, page)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ocr_page_runs (
+            content_hash  TEXT PRIMARY KEY,
+            status        TEXT NOT NULL,     -- running / complete / truncated / failed / missing
+            page_count    INTEGER,
+            pages_done    INTEGER NOT NULL DEFAULT 0,
+            error         TEXT,
+            started_at    REAL NOT NULL,
+            finished_at   REAL
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS ocr_pages_fts USING fts5(
+            text,
+            content='ocr_pages', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS ocr_pages_fts_ai AFTER INSERT ON ocr_pages
+        BEGIN
+            INSERT INTO ocr_pages_fts (rowid, text) VALUES (new.id, new.text);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS ocr_pages_fts_ad AFTER DELETE ON ocr_pages
+        BEGIN
+            INSERT INTO ocr_pages_fts (ocr_pages_fts, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS ocr_pages_fts_au AFTER UPDATE OF text ON ocr_pages
+        BEGIN
+            INSERT INTO ocr_pages_fts (ocr_pages_fts, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO ocr_pages_fts (rowid, text) VALUES (new.id, new.text);
+        END
+        """
+    )
+
+# ────────────────────────── STORAGE ──────────────────────────
+def save_page(conn: sqlite3.Connection, content_hash: str, page: int,
+              extraction: Extraction) -> None:
+    conn.execute(
+        """
+        INSERT INTO ocr_pages (content_hash, page, text, method, confidence, ocr_dpi)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(content_hash, page) DO UPDATE SET
+            text = excluded.text, method = excluded.method,
+            confidence = excluded.confidence, ocr_dpi = excluded.ocr_dpi
+        """,
+        (content_hash, page, extraction.text, extraction.method,
+         extraction.confidence, extraction.dpi)
+    )
+    conn.execute(
+        "UPDATE ocr_page_runs SET pages_done = pages_done + 1 WHERE content_hash = ?",
+        (content_hash,)
+    )
+
+def claim_next(conn: sqlite3.Connection):
+    """Start a run for the newest document without one; ``hash`` or ``None``."""
+    now = time.time()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            """
+            SELECT d.content_hash FROM documents d
+            LEFT JOIN ocr_page_runs r ON r.content_hash = d.content_hash
+            WHERE d.content_hash IS NOT NULL
+              AND (r.content_hash IS NULL
+                   OR (r.status = 'running' AND r.started_at < ?))
+            ORDER BY d.id DESC LIMIT 1
+            """,
+            (now - STALE_RUN,)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO ocr_page_runs (content_hash, status, started_at)
+                VALUES (?, 'running', ?)
+                """,
+                (row[0], now)
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return row[0] if row else None
+
+def finish_run(content_hash: str, status: str, count=None, error=None) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            """
+            UPDATE ocr_page_runs SET status = ?, page_count = ?, error = ?, finished_at = ?
+            WHERE content_hash = ?
+            """,
+            (status, count, error, time.time(), content_hash)
+        )
+
+# ─────────────────────────── OCR ─────────────────────────────
+def _page_task(task) -> Extraction:
+    """Runs in the pool: one ``(path, page)``; counted as ``page_*`` stats."""
+    path, page = task
+    return extract(path, page, stats="page_")
+
+def ocr_pages(path, pages, engine: OcrEngine, deadline: float):
+    """
+    OCR *pages* (ascending) of one PDF on *engine*, page-parallel.
+    Yields ``(page, extraction, error)`` in page order as soon as the
+    next page is done; stops (cancelling what hasn't started) once
+    *deadline* (``time.monotonic()``) has passed.
+    """
+    pages = list(pages)
+    if not pages:
+        return
+    ready, expected = {}, 0
+    outcomes = engine.run([(str(path), page) for page in pages], _page_task)
+    try:
+        for outcome in outcomes:
+            ready[outcome.path[1]] = outcome
+            while expected < len(pages) and pages[expected] in ready:
+                done = ready.pop(pages[expected])
+                yield pages[expected], done.text, done.error
+                expected += 1
+            if time.monotonic() > deadline:
+                break
+    finally:
+        outcomes.close()
+
+def document_path(conn: sqlite3.Connection, content_hash: str):
+    """The stored PDF with *content_hash*: its blob, else a legacy flat upload."""
+    path = blob_path(UPLOAD_FOLDER, content_hash)
+    if path.exists():
+        return path
+    names = conn.execute(
+        "SELECT filename FROM documents WHERE content_hash = ?", (content_hash,)
+    ).fetchall()
+    for (filename,) in names:
+        path = local_path(conn, UPLOAD_FOLDER, filename)
+        if path.exists():
+            return path
+    return None
+
+def index_document(content_hash: str, engine: OcrEngine = None) -> str:
+    """OCR every page of one stored PDF within the limits; returns the run status."""
+    engine = engine or get_engine()
+    path = document_path(get_connection(), content_hash)
+    if path is None:
+        finish_run(content_hash, "missing", error="berkas PDF tidak ditemukan di uploads/")
+        return "missing"
+    deadline = time.monotonic() + DOCUMENT_BUDGET
+    try:
+        count = page_count(path)
+    except (OSError, RuntimeError) as e:
+        finish_run(content_hash, "failed", error=str(e))
+        return "failed"
+
+    first = 1
+    with get_connection() as conn:
+        # page 1 is already in the OCR store from the upload
+        row = conn.execute(
+            "SELECT text, method, confidence, ocr_dpi FROM ocr_results WHERE content_hash = ?",
+            (content_hash,)
+        ).fetchone()
+        if row is not None:
+            save_page(conn, content_hash, 1, Extraction(*row))
+            first = 2
+
+    last, errors = min(count, MAX_PAGES), []
+    reached, stored = first - 1, first - 1
+    for page, extraction, error in ocr_pages(path, range(first, last + 1), engine, deadline):
+        reached = page
+        if error is None:
+            error = extraction.error
+        if error:
+            errors.append(f"hal. {page}: {error}")
+            continue
+        with get_connection() as conn:
+            save_page(conn, content_hash, page, extraction)
+        stored += 1
+
+    if not stored:
+        status = "failed"
+    elif reached < count:
+        status = "truncated"
+    else:
+        status = "complete"
+    finish_run(content_hash, status, count, "; ".join(errors)[:1000] or None)
+    return status
+
+def index_next(engine: OcrEngine = None):
+    """One step of the background mode: OCR the next document, if any."""
+    content_hash = claim_next(get_connection())
+    if content_hash is None:
+        return None
+    return index_document(content_hash, engine)
+
+# ─────────────────────────── ROUTES ──────────────────────────
+@page_ocr_bp.route("/search/pages")
+def search_pages():
+    q = request.args.get("q", "").strip()
+    match = search_index.fts_query(q)
+    hits = []
+    if match:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            hits = cur.execute(
+                f"""
+                SELECT d.id, d.filename, d.content_hash, p.page,
+                       snippet(ocr_pages_fts, 0, char(2), char(3), '…',
+                               {search_index.SNIPPET_TOKENS}) AS snippet
+                FROM ocr_pages_fts
+                JOIN ocr_pages p ON p.id = ocr_pages_fts.rowid
+                JOIN documents d ON d.content_hash = p.content_hash
+                WHERE ocr_pages_fts MATCH ?
+                ORDER BY bm25(ocr_pages_fts), d.id, p.page
+                LIMIT ?
+                """,
+                (match, SEARCH_LIMIT)
+            ).fetchall()
+    return render_template("page_search.html", q=q, hits=hits, limit=SEARCH_LIMIT)
+
+# ──────────────────────────── CLI ────────────────────────────
+def main(argv) -> None:
+    parser = argparse.ArgumentParser(description="OCR every page of archived documents.")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    with get_connection() as conn:
+        init_page_store(conn)
+    engine = OcrEngine()
+    counts = {}
+    try:
+        while args.limit is None or sum(counts.values()) < args.limit:
+            status = index_next(engine)
+            if status is None:
+                break
+            counts[status] = counts.get(status, 0) + 1
+    finally:
+        engine.shutdown()
+    print("✅ Pages OCR'd:", ", ".join(f"{n} {s}" for s, n in counts.items()) or "nothing to do")
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv[1:])
+    except Exception as exc:
+        print("❌ Something went wrong:", exc, file=sys.stderr)
+        sys.exit(1)
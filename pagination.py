@@ -0,0 +1,105 @@
+"""
+pagination.py
+-------------------------------------------------
+Keyset ("seek") pagination for the document list.
+
+Instead of ``OFFSET`` (which still walks every skipped row) each page
+starts right after the last row of the previous one: the query orders
+by ``(sort key, id)`` and filters with a row-value comparison against
+the boundary row carried in an opaque cursor. Page *N* therefore costs
+the same as page 1, whatever the sort column and direction.
+
+Sort keys must never be NULL, since NULL row values compare as unknown
+and those rows would silently drop out of every page (``init_db``
+normalizes them to '').
+"""
+
+from typing import NamedTuple, Optional
+import base64
+import json
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+DEFAULT_PER_PAGE  = 50
+MAX_PER_PAGE      = 200
+
+# ────────────────────────── CURSORS ──────────────────────────
+def encode_cursor(sort_value, row_id: int) -> str:
+    raw = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str):
+    """Returns ``(sort_value, row_id)`` or ``None`` for a missing/garbled cursor."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        sort_value, row_id = json.loads(raw)
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+def clamp_per_page(value) -> int:
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PER_PAGE
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+# ────────────────────────── QUERIES ──────────────────────────
+class Seek(NamedTuple):
+    where: Optional[str]     # extra WHERE condition, or None on the first page
+    params: list
+    order_by: str
+    backwards: bool          # rows come back reversed; flip them after fetching
+
+def seek(sort_expr: str, id_expr: str, sort_dir: str,
+         after=None, before=None) -> Seek:
+    """
+    Build the keyset condition and ORDER BY for one page.
+    *after* / *before* are decoded cursors; *before* walks back a page.
+    """
+    desc = sort_dir == "desc"
+    if before is not None:
+        # Walk backwards: invert the comparison and the order, reverse later
+        op, order = (">" if desc else "<"), ("ASC" if desc else "DESC")
+        boundary, backwards = before, True
+    else:
+        op, order = ("<" if desc else ">"), ("DESC" if desc else "ASC")
+        boundary, backwards = after, False
+
+    order_by = f"{sort_expr} {order}, {id_expr} {order}"
+    if boundary is None:
+        return Seek(None, [], order_by, backwards)
+    return Seek(
+        f"({sort_expr}, {id_expr}) {op} (?, ?)",
+        [boundary[0], boundary[1]],
+        order_by,
+        backwards,
+    )
+
+class Page(NamedTuple):
+    rows: list
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+def paginate(rows: list, per_page: int, backwards: bool,
+             had_cursor: bool, key_index=-1, id_index=0) -> Page:
+    """
+    Turn a ``per_page + 1`` fetch into a page plus its neighbour cursors.
+    The extra row only tells whether there is more in the fetch direction.
+    """
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return Page(rows, None, None)
+
+    first, last = rows[0], rows[-1]
+    has_next = had_cursor if backwards else more
+    has_prev = more if backwards else had_cursor
+    return Page(
+        rows,
+        encode_cursor(last[key_index], last[id_index]) if has_next else None,
+        encode_cursor(first[key_index], first[id_index]) if has_prev else None,
+    )
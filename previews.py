@@ -0,0 +1,86 @@
+"""
+previews.py
+-------------------------------------------------
+Page-1 images of stored PDFs for the list page and the confirm page.
+
+While a PDF is OCR'd (``ocr_service.extract_text_from_pdf``) the page-1
+raster rendered for Tesseract is also scaled down into a small
+thumbnail (``static/thumbnails``) and a medium preview
+(``static/previews``), so the PDF is never rendered twice. PDFs read
+through their text layer get one cheap low-DPI render instead.
+
+Images are named after the content hash of the PDF (the blob name in
+``uploads/ab/cd/``), so they never change once written and are served
+with a one-year, ``immutable`` cache lifetime.
+"""
+
+from flask import Blueprint, send_from_directory, abort
+from PIL import Image, features
+from pathlib import Path
+import os
+import re
+import tempfile
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+STATIC_DIR    = Path(__file__).resolve().parent / "static"
+SIZES = {
+    # kind: (folder, longest edge in px)
+    "thumb":   (STATIC_DIR / "thumbnails", 160),
+    "preview": (STATIC_DIR / "previews", 900),
+}
+RENDER_DPI    = 110        # text-layer PDFs: just enough for the preview
+IMAGE_FORMAT  = "WEBP" if features.check("webp") else "JPEG"
+IMAGE_EXT     = ".webp" if IMAGE_FORMAT == "WEBP" else ".jpg"
+IMAGE_QUALITY = 75
+CACHE_SECONDS = 365 * 24 * 3600
+
+HASH_RE = re.compile(r"[0-9a-f]{64}")
+
+# ──────────────────────── BLUEPRINT SETUP ─────────────────────
+previews_bp = Blueprint("previews_bp", __name__)
+
+# ────────────────────────── HELPERS ──────────────────────────
+def key_for(pdf_path):
+    """Content hash of a blob path (``…/<sha256>.pdf``), else ``None``."""
+    stem = Path(pdf_path).stem
+    return stem if HASH_RE.fullmatch(stem) else None
+
+def image_path(kind: str, key: str) -> Path:
+    folder, _ = SIZES[kind]
+    return folder / (key + IMAGE_EXT)
+
+def has_previews(key: str) -> bool:
+    return all(image_path(kind, key).exists() for kind in SIZES)
+
+def save_previews(image: Image.Image, key: str) -> bool:
+    """
+    Scale a page raster into every missing size. Failures are reported,
+    never raised: a missing thumbnail must not fail the OCR around it.
+    """
+    try:
+        for kind, (folder, edge) in SIZES.items():
+            dest = image_path(kind, key)
+            if dest.exists():
+                continue
+            folder.mkdir(parents=True, exist_ok=True)
+            scaled = image.convert("RGB")
+            scaled.thumbnail((edge, edge), Image.LANCZOS)
+            fd, tmp = tempfile.mkstemp(suffix=IMAGE_EXT, dir=folder)
+            with os.fdopen(fd, "wb") as fh:
+                scaled.save(fh, IMAGE_FORMAT, quality=IMAGE_QUALITY)
+            os.replace(tmp, dest)
+        return True
+    except Exception as e:
+        print("⚠️ Preview gagal:", key, "→", e)
+        return False
+
+# ─────────────────────────── ROUTES ──────────────────────────
+@previews_bp.route("/previews/<key>/<kind>")
+def image(key, kind):
+    if kind not in SIZES or not HASH_RE.fullmatch(key):
+        abort(404)
+    folder, _ = SIZES[kind]
+    response = send_from_directory(folder, key + IMAGE_EXT, max_age=CACHE_SECONDS)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
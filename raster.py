@@ -0,0 +1,174 @@
+"""
+raster.py
+-------------------------------------------------
+Renders PDF pages for OCR without temp files or extra copies.
+
+``pdftoppm`` writes the page as a binary PGM (grayscale) or PPM to its
+stdout. The header is parsed off the pipe and the pixels are read
+straight into one preallocated buffer, which is then shared, not
+copied: Pillow wraps it for the thumbnails and libtesseract reads it in
+place (see ``ocr_backend``). The buffer is the only page-sized
+allocation on the Python side, and its size is what
+``ocr_cache_stats`` reports as ``raster_bytes``.
+
+Grayscale is all Tesseract uses anyway and a third of the size of RGB:
+an A4 page at 200 DPI is ~3.7 MB instead of ~11 MB.
+
+Configuration (environment variables):
+    OCR_DPI        render resolution for OCR, default 200
+    POPPLER_PATH   folder holding the poppler binaries when they are
+                   not on PATH
+"""
+
+from typing import NamedTuple
+import os
+import shutil
+import subprocess
+import threading
+
+from PIL import Image
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+POPPLER_PATH    = os.environ.get("POPPLER_PATH") or None
+PDFTOPPM        = shutil.which("pdftoppm", path=POPPLER_PATH)
+PDFINFO         = shutil.which("pdfinfo", path=POPPLER_PATH)
+OCR_DPI         = int(os.environ.get("OCR_DPI", "200"))
+RENDER_TIMEOUT  = 120     # seconds before a stuck pdftoppm is killed
+PDFINFO_TIMEOUT = 30
+STDERR_KEEP     = 2000    # bytes of pdftoppm's complaints kept for errors
+MAGIC_MODES     = {b"P5": "L", b"P6": "RGB"}
+
+# ────────────────────────── RASTERS ──────────────────────────
+class PageRaster(NamedTuple):
+    width: int
+    height: int
+    mode: str               # "L" or "RGB"
+    dpi: int
+    pixels: bytearray       # rows top to bottom, no padding
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.pixels)
+
+    @property
+    def channels(self) -> int:
+        return 1 if self.mode == "L" else 3
+
+    def image(self) -> Image.Image:
+        """Pillow view of the raster (shares the buffer for grayscale)."""
+        img = Image.frombuffer(self.mode, (self.width, self.height),
+                               self.pixels, "raw", self.mode, 0, 1)
+        img.info["dpi"] = (self.dpi, self.dpi)
+        return img
+
+# ────────────────────────── HELPERS ──────────────────────────
+def _read_header(stream):
+    """``(magic, width, height, maxval)`` of a binary netpbm stream."""
+    fields, token = [], b""
+    while len(fields) < 4:
+        byte = stream.read(1)
+        if not byte:
+            raise RuntimeError("pdftoppm ended before the image header")
+        if byte == b"#" and not token:
+            while byte not in (b"\n", b""):       # comment line
+                byte = stream.read(1)
+            continue
+        if byte.isspace():
+            if token:
+                fields.append(token)
+                token = b""
+        else:
+            token += byte
+    magic, width, height, maxval = fields
+    if magic not in MAGIC_MODES or maxval != b"255":
+        raise RuntimeError(f"unexpected pdftoppm output ({magic!r}, maxval {maxval!r})")
+    return magic, int(width), int(height), int(maxval)
+
+def _drain(stream, tail: list) -> None:
+    """Keeps stderr flowing (a full pipe would block pdftoppm)."""
+    for line in stream:
+        tail.append(line)
+        while sum(map(len, tail)) > STDERR_KEEP:
+            tail.pop(0)
+
+def _read_exact(stream, buffer: bytearray) -> int:
+    view, filled = memoryview(buffer), 0
+    while filled < len(buffer):
+        n = stream.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    return filled
+
+# ────────────────────────── RENDERING ────────────────────────
+def render_page(path, page: int = 1, dpi: int = OCR_DPI, gray: bool = True,
+                timeout: float = RENDER_TIMEOUT) -> PageRaster:
+    """
+    Render one page of *path* into memory; raises ``RuntimeError`` on
+    failure, ``TimeoutError`` when pdftoppm was killed after *timeout*.
+    """
+    if PDFTOPPM is None:
+        raise RuntimeError("pdftoppm not found; is poppler installed and in PATH?")
+    cmd = [PDFTOPPM, "-f", str(page), "-l", str(page), "-r", str(dpi)]
+    if gray:
+        cmd.append("-gray")
+    cmd.append(str(path))
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        proc.kill()
+
+    killer = threading.Timer(timeout, kill)
+    tail = []
+    drainer = threading.Thread(target=_drain, args=(proc.stderr, tail), daemon=True)
+    killer.start()
+    drainer.start()
+
+    def failure(reason: str) -> Exception:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        drainer.join()
+        if timed_out.is_set():
+            return TimeoutError(f"pdftoppm timed out after {timeout:.0f}s")
+        return RuntimeError(b"".join(tail).decode(errors="replace").strip() or reason)
+
+    try:
+        try:
+            magic, width, height, _ = _read_header(proc.stdout)
+        except RuntimeError as e:
+            raise failure(str(e)) from None
+
+        mode = MAGIC_MODES[magic]
+        pixels = bytearray(width * height * (1 if mode == "L" else 3))
+        if _read_exact(proc.stdout, pixels) != len(pixels):
+            raise failure("pdftoppm output was truncated")
+        proc.stdout.read()              # nothing should follow a single page
+        proc.wait()
+    finally:
+        killer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        drainer.join()
+        proc.stderr.close()
+    return PageRaster(width, height, mode, dpi, pixels)
+
+def page_count(path) -> int:
+    """Number of pages, from ``pdfinfo``; raises ``RuntimeError`` on failure."""
+    if PDFINFO is None:
+        raise RuntimeError("pdfinfo not found; is poppler installed and in PATH?")
+    try:
+        proc = subprocess.run([PDFINFO, str(path)], capture_output=True,
+                              timeout=PDFINFO_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"pdfinfo timed out after {PDFINFO_TIMEOUT}s") from None
+    for line in proc.stdout.decode("utf-8", errors="replace").splitlines():
+        if line.startswith("Pages:"):
+            return int(line.split(":", 1)[1])
+    raise RuntimeError(proc.stderr.decode(errors="replace").strip()
+                       or "pdfinfo reported no page count")
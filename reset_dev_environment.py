@@ -14,10 +14,22 @@ Run: python reset_dev_environment.py
 """
 
 from pathlib import Path
-import sqlite3
 import shutil
 import sys
 
+from db import connect
+from ocr_store import init_ocr_store
+from blob_store import init_blob_store
+from document_store import init_document_store
+from ingest_jobs import init_ingest_jobs
+from chunked_upload import init_upload_sessions
+from search_index import init_search_index
+from db_indexes import ensure_indexes
+from facets import init_facets
+from page_ocr import init_page_store
+from ocr_failures import init_ocr_failures
+from data_version import init_data_version
+
 # ───────────────────────── CONFIGURE HERE ──────────────────────────
 # Adjust these paths only if your project uses different names.
 PROJECT_ROOT = Path(__file__).resolve().parent          # project root
@@ -40,10 +52,13 @@ def wipe_and_recreate_dirs(dirs):
 
 def reset_database(db_path):
     """Delete old DB and create a fresh one with the stable schema."""
-    if db_path.exists():
-        db_path.unlink()
+    # WAL mode leaves -wal / -shm companions next to the database
+    for path in (db_path, db_path.with_name(db_path.name + "-wal"),
+                 db_path.with_name(db_path.name + "-shm")):
+        if path.exists():
+            path.unlink()
 
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     cur = conn.cursor()
     cur.execute(
         """
@@ -59,6 +74,17 @@ def reset_database(db_path):
         );
         """
     )
+    init_ocr_store(conn)
+    init_blob_store(conn)
+    init_document_store(conn)
+    init_ingest_jobs(conn)
+    init_upload_sessions(conn)
+    init_page_store(conn)
+    init_ocr_failures(conn)
+    init_search_index(conn)
+    init_facets(conn)
+    init_data_version(conn)
+    ensure_indexes(conn)
     conn.commit()
     conn.close()
 
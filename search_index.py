@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+search_index.py
+-------------------------------------------------
+Full-text search over the OCR text stored in ``documents.notes``.
+
+``documents_fts`` is an FTS5 external-content table over ``documents``
+(notes + filename); triggers keep it in sync on every insert, update and
+delete, so the app never writes to it directly. Results are ranked with
+BM25 and come with a highlighted snippet of the matching notes.
+
+Existing databases are indexed automatically the first time the table is
+created. To rebuild the index by hand (e.g. after editing the database
+with an external tool):
+
+Run: python search_index.py rebuild [path/to/database.db]
+"""
+
+from markupsafe import Markup, escape
+import sqlite3
+import sys
+
+from db import DB_FILE, connect
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+SNIPPET_OPEN    = "\x02"        # placeholders, swapped for <mark> after escaping
+SNIPPET_CLOSE   = "\x03"
+SNIPPET_TOKENS  = 12
+BM25_WEIGHTS    = (1.0, 2.0)    # notes, filename
+
+# SELECT / FROM fragments used by list_documents when ``q`` is given
+SNIPPET_SQL = (
+    f"snippet(documents_fts, 0, char(2), char(3), '…', {SNIPPET_TOKENS})"
+)
+RANK_SQL    = "bm25(documents_fts, {}, {})".format(*BM25_WEIGHTS)
+JOIN_SQL    = "documents_fts JOIN documents ON documents.id = documents_fts.rowid"
+
+# ────────────────────────── SCHEMA ───────────────────────────
+def init_search_index(conn: sqlite3.Connection) -> None:
+    """Create the FTS table and its sync triggers; index existing rows once."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='documents_fts'"
+    ).fetchone()
+
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+            notes, filename,
+            content='documents', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS documents_fts_ai AFTER INSERT ON documents
+        BEGIN
+            INSERT INTO documents_fts (rowid, notes, filename)
+            VALUES (new.id, new.notes, new.filename);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS documents_fts_ad AFTER DELETE ON documents
+        BEGIN
+            INSERT INTO documents_fts (documents_fts, rowid, notes, filename)
+            VALUES ('delete', old.id, old.notes, old.filename);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS documents_fts_au
+        AFTER UPDATE OF notes, filename ON documents
+        BEGIN
+            INSERT INTO documents_fts (documents_fts, rowid, notes, filename)
+            VALUES ('delete', old.id, old.notes, old.filename);
+            INSERT INTO documents_fts (rowid, notes, filename)
+            VALUES (new.id, new.notes, new.filename);
+        END
+        """
+    )
+
+    if not exists:
+        rebuild_search_index(conn)
+
+def rebuild_search_index(conn: sqlite3.Connection) -> int:
+    """Re-index every document from scratch; returns the number indexed."""
+    conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')")
+    return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+# ────────────────────────── QUERIES ──────────────────────────
+def fts_query(q: str) -> str:
+    """
+    Turn free text typed by a user into a safe FTS5 query: every word is
+    quoted (so ``-``, ``:`` or ``"`` can't become operators) and matched
+    as a prefix, all words must match.
+    """
+    terms = [t.replace('"', '""') for t in q.split()]
+    return " ".join(f'"{t}"*' for t in terms if t.strip('"'))
+
+def highlight(snippet) -> Markup:
+    """Jinja filter: escape a snippet, then turn the match markers into <mark>."""
+    if not snippet:
+        return Markup("")
+    return Markup(
+        str(escape(snippet))
+        .replace(SNIPPET_OPEN, "<mark>")
+        .replace(SNIPPET_CLOSE, "</mark>")
+    )
+
+# ──────────────────────────── CLI ────────────────────────────
+def main(argv) -> None:
+    if len(argv) < 2 or argv[1] != "rebuild":
+        print(__doc__)
+        sys.exit(2)
+    db_path = argv[2] if len(argv) > 2 else DB_FILE
+
+    with connect(db_path) as conn:
+        init_search_index(conn)
+        count = rebuild_search_index(conn)
+    print(f"✅ Search index rebuilt: {count} documents in {db_path}")
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv)
+    except Exception as exc:
+        print("❌ Something went wrong:", exc, file=sys.stderr)
+        sys.exit(1)
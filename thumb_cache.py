@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+thumb_cache.py
+-------------------------------------------------
+On-demand thumbnails for documents that predate ingest-time previews.
+
+``/thumb/<doc_id>/<size>`` (size: ``thumb`` or ``preview``) serves the
+image from ``static/thumbnails`` / ``static/previews`` and renders it on
+first request. Concurrent requests for the same document share one
+render: threads of a worker wait on the first one, and other gunicorn
+workers wait on a ``<key>.lock`` file next to the image.
+
+A PDF that can't be rendered leaves a ``<key>.failed`` marker; the
+route answers 404 for it without calling pdftoppm again until the
+marker is ``FAILED_RETRY`` seconds old.
+
+Both folders together are capped at ``PREVIEW_CACHE_MAX_MB``, whoever
+wrote the images (ingest, uploads or this route). Serving an image
+refreshes its mtime; the ingest thread of each app process checks the
+size every ``EVICT_INTERVAL`` seconds and deletes the least recently
+used images once the cap is exceeded (they are simply rendered again
+when asked for). Without the ingest thread, run ``evict`` from cron.
+
+To fill the cache for the existing archive without blocking the app
+(runs at low CPU priority on the OCR process pool):
+
+Run: python thumb_cache.py warm [--limit N]
+     python thumb_cache.py evict
+"""
+
+from flask import Blueprint, abort, send_file
+from contextlib import contextmanager
+from pathlib import Path
+import argparse
+import os
+import sys
+import threading
+import time
+
+import previews
+from blob_store import local_path
+from db import get_connection
+from ocr_engine import OcrEngine
+from ocr_service import render_previews
+from ocr_store import file_sha256, attach_document
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+UPLOAD_FOLDER   = "uploads"
+MAX_BYTES       = int(os.environ.get("PREVIEW_CACHE_MAX_MB", "512")) * 1024 * 1024
+RENDER_TIMEOUT  = 60       # seconds a waiter trusts someone else's render
+RENDER_SLOTS    = 2        # concurrent renders per worker process
+TOUCH_INTERVAL  = 3600     # refresh an image's mtime at most hourly
+EVICT_INTERVAL  = 60       # seconds between cache-size checks per process
+FAILED_RETRY    = 24 * 3600   # a failed render is tried again after this
+WARM_FILL       = 0.9      # warm stops at this share of the cap
+SERVE_MAX_AGE   = 24 * 3600
+
+# ──────────────────────── BLUEPRINT SETUP ─────────────────────
+thumb_bp = Blueprint("thumb_bp", __name__)
+
+# ───────────────────────── COALESCING ────────────────────────
+_inflight = {}                          # key → Event set when its render ends
+_inflight_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(RENDER_SLOTS)
+_last_evict = 0.0
+
+@contextmanager
+def _file_lock(key: str):
+    """Cross-process render lock; yields whether this process holds it."""
+    folder, _ = previews.SIZES["thumb"]
+    folder.mkdir(parents=True, exist_ok=True)
+    lock = folder / f"{key}.lock"
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - lock.stat().st_mtime > RENDER_TIMEOUT:
+                lock.unlink()           # its owner died mid-render
+        except OSError:
+            pass
+        yield False
+        return
+    os.close(fd)
+    try:
+        yield True
+    finally:
+        lock.unlink(missing_ok=True)
+
+def _failed_marker(key: str) -> Path:
+    folder, _ = previews.SIZES["thumb"]
+    return folder / f"{key}.failed"
+
+def render_failed(key: str) -> bool:
+    """Whether *key* failed to render less than ``FAILED_RETRY`` seconds ago."""
+    try:
+        return time.time() - _failed_marker(key).stat().st_mtime < FAILED_RETRY
+    except OSError:
+        return False
+
+def _render(pdf_path, key: str) -> None:
+    if not render_previews(pdf_path, key):
+        marker = _failed_marker(key)
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        marker.touch()
+
+def _render_once(key: str, pdf_path: Path) -> None:
+    with _file_lock(key) as owner:
+        if owner:
+            if not previews.has_previews(key):
+                with _slots:
+                    _render(pdf_path, key)
+            return
+    # another worker is rendering: wait for its result
+    deadline = time.monotonic() + RENDER_TIMEOUT
+    while (not previews.has_previews(key) and not render_failed(key)
+           and time.monotonic() < deadline):
+        time.sleep(0.2)
+
+def ensure_previews(key: str, pdf_path: Path) -> bool:
+    """Render *key*'s images unless present; concurrent callers share one render."""
+    if previews.has_previews(key):
+        return True
+    if render_failed(key):
+        return False
+    with _inflight_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+    if not leader:
+        event.wait(RENDER_TIMEOUT)
+        return previews.has_previews(key)
+
+    try:
+        _render_once(key, pdf_path)
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        event.set()
+    return previews.has_previews(key)
+
+# ────────────────────────── EVICTION ─────────────────────────
+def _cached_images():
+    for folder, _ in previews.SIZES.values():
+        if folder.is_dir():
+            yield from folder.glob("*" + previews.IMAGE_EXT)
+
+def cache_size() -> int:
+    return sum(p.stat().st_size for p in _cached_images())
+
+def evict(max_bytes: int = MAX_BYTES) -> int:
+    """Delete least recently used images until under *max_bytes*; returns count."""
+    entries = []
+    for path in _cached_images():
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        evicted += 1
+    return evicted
+
+def maybe_evict() -> None:
+    """Enforce the cap at most every ``EVICT_INTERVAL``; for the ingest thread."""
+    global _last_evict
+    now = time.monotonic()
+    if now - _last_evict >= EVICT_INTERVAL:
+        _last_evict = now
+        evict()
+
+def _touch(path: Path) -> None:
+    try:
+        if time.time() - path.stat().st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+# ────────────────────────── DOCUMENTS ────────────────────────
+def document_key(conn, doc_id: int):
+    """``(key, pdf_path)`` for a document, or ``None`` if it has no file."""
+    row = conn.execute(
+        "SELECT filename, content_hash FROM documents WHERE id = ?", (doc_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    filename, content_hash = row
+    pdf_path = local_path(conn, UPLOAD_FOLDER, filename)
+    if content_hash is None:
+        if not pdf_path.exists():
+            return None
+        # legacy row: hash once and remember it, like the edit page does
+        content_hash = file_sha256(pdf_path)
+        attach_document(conn, doc_id, content_hash)
+    return content_hash, pdf_path
+
+# ─────────────────────────── ROUTES ──────────────────────────
+@thumb_bp.route("/thumb/<int:doc_id>/<size>")
+def thumb(doc_id, size):
+    if size not in previews.SIZES:
+        abort(404)
+    with get_connection() as conn:
+        found = document_key(conn, doc_id)
+    if found is None:
+        abort(404)
+    key, pdf_path = found
+    if not pdf_path.exists() or not ensure_previews(key, pdf_path):
+        abort(404)
+
+    image = previews.image_path(size, key)
+    _touch(image)
+    return send_file(image, max_age=SERVE_MAX_AGE)
+
+# ──────────────────────────── WARM ───────────────────────────
+def _warm_one(path: str) -> str:
+    """Runs in the pool: render one blob (or legacy file) and return its key."""
+    key = previews.key_for(path) or file_sha256(path)
+    if not previews.has_previews(key):
+        _render(path, key)
+    return key
+
+def warm(limit=None) -> int:
+    """Render missing images, newest documents first, until the cap is nearly full."""
+    todo = []
+    with get_connection() as conn:
+        ids = [r[0] for r in conn.execute("SELECT id FROM documents ORDER BY id DESC")]
+        for doc_id in ids:
+            found = document_key(conn, doc_id)
+            if (found and found[1].exists() and not previews.has_previews(found[0])
+                    and not render_failed(found[0])):
+                todo.append(str(found[1]))
+            if limit and len(todo) >= limit:
+                break
+    print(f"⚙️  {len(todo)} documents without thumbnails")
+
+    budget = MAX_BYTES * WARM_FILL
+    size = cache_size()
+    engine = OcrEngine()
+    done = 0
+    try:
+        for outcome in engine.run(todo, _warm_one):
+            if outcome.error:
+                print("❌", outcome.path, "→", outcome.error)
+                continue
+            done += 1
+            size += sum(previews.image_path(kind, outcome.text).stat().st_size
+                        for kind in previews.SIZES
+                        if previews.image_path(kind, outcome.text).exists())
+            if size >= budget:
+                print("⚠️  Cache cap reached, stopping early.")
+                break
+    finally:
+        engine.shutdown()
+    return done
+
+def main(argv) -> None:
+    parser = argparse.ArgumentParser(description="Pre-render document thumbnails.")
+    parser.add_argument("command", choices=["warm", "evict"])
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "evict":
+        evicted = evict()
+        print(f"✅ {evicted} images evicted; cache {cache_size() / 1024 / 1024:.1f} MB "
+              f"of {MAX_BYTES // 1024 // 1024} MB")
+        return
+
+    if hasattr(os, "nice"):
+        os.nice(10)                     # inherited by the pool; the app keeps priority
+    done = warm(args.limit)
+    print(f"✅ {done} documents rendered; cache {cache_size() / 1024 / 1024:.1f} MB "
+          f"of {MAX_BYTES // 1024 // 1024} MB")
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv[1:])
+    except Exception as exc:
+        print("❌ Something went wrong:", exc, file=sys.stderr)
+        sys.exit(1)
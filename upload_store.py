@@ -0,0 +1,142 @@
+"""
+upload_store.py
+-------------------------------------------------
+Streaming upload writes for ``/upload`` and ``/batch-upload``.
+
+Werkzeug normally parses a multipart body into in-memory buffers (or an
+anonymous temp file) and ``file.save()`` then copies it into
+``uploads/``, after which the file is read again to hash it. Here the
+parser writes every chunk straight into a temp file under
+``uploads/.incoming`` while updating its SHA-256 and checking the size
+limit; :func:`save_upload` fsyncs it and hands it to ``blob_store``,
+which renames it into place (or drops it when that content is already
+stored), so a reader never sees a half-written PDF and the content is
+never re-read just to hash it.
+
+Configuration (environment variables):
+    UPLOAD_MAX_FILE_MB      largest single PDF, default 200
+    UPLOAD_MAX_REQUEST_MB   largest request body (``MAX_CONTENT_LENGTH``),
+                            default 1024
+"""
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from pathlib import Path
+import hashlib
+import os
+import tempfile
+import time
+
+from blob_store import add_file
+from ocr_store import file_sha256
+
+# ───────────────────────── CONSTANTS ─────────────────────────
+MB                  = 1024 * 1024
+MAX_FILE_BYTES      = int(os.environ.get("UPLOAD_MAX_FILE_MB", "200")) * MB
+MAX_REQUEST_BYTES   = int(os.environ.get("UPLOAD_MAX_REQUEST_MB", "1024")) * MB
+INCOMING_DIR        = ".incoming"         # inside UPLOAD_FOLDER, same filesystem
+STALE_AFTER         = 24 * 3600           # seconds before a leftover temp is swept
+
+# ────────────────────────── STREAMS ──────────────────────────
+class HashingUpload:
+    """
+    Writable, readable temp file that hashes what is written to it and
+    refuses to grow past *max_bytes*. Deleted on close unless it was
+    handed over with :meth:`finish`.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = MAX_FILE_BYTES):
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix=".part", dir=directory)
+        self.file = os.fdopen(fd, "w+b")
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.committed = False
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.close()
+            raise RequestEntityTooLarge(
+                f"File lebih besar dari {self.max_bytes // MB} MB."
+            )
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        # read / seek / readline / tell … for FileStorage
+        return getattr(self.file, name)
+
+    def finish(self) -> str:
+        """fsync and close; the caller now owns :attr:`path`. Returns the SHA-256."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.committed = True
+        return self.sha256.hexdigest()
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.unlink(self.path)
+
+class StreamingRequest(Request):
+    """Flask request class whose file parts stream into :class:`HashingUpload`."""
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        upload = HashingUpload(incoming_dir())
+        self.__dict__.setdefault("_uploads", []).append(upload)
+        return upload
+
+    def close(self) -> None:
+        super().close()
+        # also parts the parser dropped because a later one failed
+        for upload in self.__dict__.get("_uploads", ()):
+            upload.close()
+
+# ────────────────────────── SAVING ───────────────────────────
+def incoming_dir() -> Path:
+    return Path(current_app.config["UPLOAD_FOLDER"]) / INCOMING_DIR
+
+def save_upload(storage, filename: str):
+    """
+    Store an uploaded ``FileStorage`` as *filename*. Returns
+    ``(stored_filename, content_hash, is_new_blob)``; see
+    :func:`blob_store.add_file`. Streams from another request class are
+    saved and hashed the slow way.
+    """
+    stream = storage.stream
+    if isinstance(stream, HashingUpload):
+        src, content_hash = stream.path, stream.finish()
+    else:
+        fd, src = tempfile.mkstemp(suffix=".part", dir=incoming_dir())
+        os.close(fd)
+        storage.save(src)
+        content_hash = file_sha256(src)
+    try:
+        name, is_new = add_file(current_app.config["UPLOAD_FOLDER"], src,
+                                content_hash, filename)
+    except Exception:
+        if os.path.exists(src):
+            os.unlink(src)
+        raise
+    return name, content_hash, is_new
+
+def sweep_incoming(upload_folder) -> int:
+    """Remove temp files a killed worker left behind; returns how many."""
+    directory = Path(upload_folder) / INCOMING_DIR
+    if not directory.is_dir():
+        return 0
+    removed = 0
+    cutoff = time.time() - STALE_AFTER
+    for path in directory.glob("*.part"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            pass
+    return removed